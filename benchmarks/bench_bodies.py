@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for building subnet request bodies from a NIOS networks CSV.
+
+Generates a synthetic networks file (1M rows with 50 OPTION-DHCP-XXX columns by default) and reports rows/sec for:
+- parse:  reading the CSV only, the lower bound for both variants
+- before: csv.DictReader, string concatenation, json.loads(json.dumps(body)) and a regex over every column per row
+- after:  readcsv() rows and the mapper compiled once per CSV header, serializing every body once
+
+No API calls are made, the option codes and DHCP hosts are served from a prefilled resolver cache.
+
+Usage:
+    python benchmarks/bench_bodies.py [--rows 1000000] [--options 50] [--csv networks.csv]
+"""
+
+import argparse, csv, json, os, re, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import csv2b1ddi
+
+ipspacePath = 'ipam/ip_space/00000000-0000-0000-0000-000000000000'
+optioncodes = [code for code in range(1, 255) if code not in (3, 6, 15)]
+
+# Definition for writing the synthetic networks CSV
+def generate(csvfile, rows, options):
+    codes = optioncodes[:options]
+    with open(csvfile, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['header-network', 'address*', 'netmask*', 'comment', 'dhcp_members', 'domain_name', 'domain_name_servers', 'routers'] + ['OPTION-DHCP-' + str(code) for code in codes])
+        for i in range(rows):
+            address = '10.' + str(i >> 16 & 255) + '.' + str(i >> 8 & 255) + '.0'
+            values = ['option-' + str(code) if (i + code) % 3 else '' for code in codes] # A third of the options is empty
+            writer.writerow(['network', address, '255.255.255.0', 'Network "' + str(i) + '"', 'dhcp1', 'example.com', '10.0.0.53', address[:-1] + '1'] + values)
+
+# The body building as it was before the compiled mappers, without printing the option values
+def legacyDhcpoptions(csvline, optionDict):
+    dhcpoptions = {optionDict[15]: csvline['domain_name'], optionDict[6]: csvline['domain_name_servers'], optionDict[3]: csvline['routers']}
+    for keys in csvline.keys():
+        if re.match('^OPTION-DHCP-(?<!\\d)(?:[1-9]?\\d|1\\d\\d|2(?:[0-4]\\d|5[0-5]))(?!\\d)', keys):
+            code = (re.findall('\\d+', keys))
+            codeInteger = int(code[0])
+            dhcpoptions.update({optionDict[codeInteger]: csvline[keys]})
+    nonemptydhcpoptions = {k: v for k, v in dhcpoptions.items() if v}
+    dhcpoptionlist = []
+    for key in nonemptydhcpoptions:
+        dhcpoptionlist.append({"type": "option", "option_code": key, "option_value": nonemptydhcpoptions[key]})
+    return json.dumps(dhcpoptionlist)
+
+def legacy(csvfile, optionDict, dhcpservers):
+    jsonTags = '"tags":{}'
+    rows = 0
+    with open(csvfile, 'r') as f:
+        for item in csv.DictReader(f):
+            cidr = str(csv2b1ddi.ipaddress.ip_network('0.0.0.0/' + item['netmask*']).prefixlen)
+            dhcphostID = dhcpservers.get(item['dhcp_members'], '')
+            jsonDhcpoptions = legacyDhcpoptions(item, optionDict)
+            body = ('{"space":"' + ipspacePath + '","address":"' + item['address*'] + '","cidr":' + cidr + ',"dhcp_host":"' + dhcphostID + '","comment":"' + item['comment'] + '","dhcp_options":' + jsonDhcpoptions + ',' + jsonTags + '}')
+            json.loads(json.dumps(body))
+            rows += 1
+    return rows
+
+def compiled(csvfile, migrator):
+    rows = 0
+    columns = None
+    for item in csv2b1ddi.readcsv(csvfile):
+        if item.columns is not columns:
+            columns = item.columns
+            build = csv2b1ddi.buildnetwork(columns, migrator)
+        csv2b1ddi.serialize(build(item.values)[1])
+        rows += 1
+    return rows
+
+def parse(csvfile):
+    rows = 0
+    for item in csv2b1ddi.readcsv(csvfile):
+        rows += 1
+    return rows
+
+def measure(name, function, *args):
+    start = time.perf_counter()
+    rows = function(*args)
+    elapsed = time.perf_counter() - start
+    print('{:<8} {:>10} rows {:>8.1f} s {:>10.0f} rows/sec'.format(name, rows, elapsed, rows / elapsed))
+    return rows / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark subnet body building before and after the compiled mappers')
+    parser.add_argument('--rows', type=int, default=1000000, help="Number of networks to generate")
+    parser.add_argument('--options', type=int, default=50, help="Number of OPTION-DHCP-XXX columns")
+    parser.add_argument('--csv', help="Existing networks CSV to use instead of a generated one")
+    args = parser.parse_args()
+
+    optionDict = {code: 'dhcp/option_code/' + str(code) for code in range(1, 255)}
+    dhcpservers = {'dhcp1': 'dhcp/host/1'}
+
+    # Serve the lookups from memory instead of B1DDI, the migrator never connects
+    migrator = csv2b1ddi.Migrator('benchmark.ini', 'default')
+    migrator.resolver = csv2b1ddi.Resolver(None)
+    migrator.resolver.cache.update({'ipspace': {'default': ipspacePath}, 'optioncode': optionDict, 'dhcphost': dhcpservers})
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csvfile = args.csv
+        if csvfile is None:
+            csvfile = os.path.join(tmpdir, 'networks.csv')
+            print('Generating ' + str(args.rows) + ' networks with ' + str(args.options) + ' option columns')
+            generate(csvfile, args.rows, args.options)
+        measure('parse', parse, csvfile)
+        before = measure('before', legacy, csvfile, optionDict, dhcpservers)
+        after = measure('after', compiled, csvfile, migrator)
+        print('Speedup: {:.1f}x'.format(after / before))
+
+if __name__ == '__main__':
+    main()
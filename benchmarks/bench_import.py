@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+End-to-end import benchmark against the local mock B1DDI server.
+
+For every dataset size the synthetic NIOS CSV files are generated (see generate_csv.py) and every object type
+is imported on its own by running csv2b1ddi.py against mock_b1ddi.py. Per object type and dataset size it
+reports:
+- objects/sec: rows in the CSV file divided by the wall time of the import
+- p50/p99:     latency of the create and update calls as measured by the mock server
+- peak RSS:    maximum resident memory of the csv2b1ddi.py process
+- 429/5xx:     throttled and failed calls, which the transport retries
+
+Peak RSS is read with os.wait4, so the benchmark runs on Linux and macOS only.
+
+Usage:
+    python benchmarks/bench_import.py [--sizes 1000,10000] [--types network,arecord] [--workers 16]
+                                      [--latency 0.02] [--jitter 0.005] [--error-rate 0] [--rate 0]
+                                      [--args "--gzip"] [--output results.jsonl]
+"""
+
+import argparse, json, os, shlex, socket, subprocess, sys, tempfile, time, urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate_csv
+
+directory = os.path.dirname(os.path.abspath(__file__))
+script = os.path.join(directory, '..', 'csv2b1ddi.py')
+flags = {'networkcontainer': '-b', 'network': '-n', 'dhcprange': '-r', 'fixedaddress': '-f', 'authzone': '-z', 'arecord': '-a',
+         'txtrecord': '-t', 'mxrecord': '-m', 'ptrrecord': '-p', 'srvrecord': '-s', 'aaaarecord': '--aaaa', 'cnamerecord': '--cname'}
+
+def freeport():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def writeini(filename, url):
+    with open(filename, 'w') as f:
+        f.write("[BloxOne]\nurl = '" + url + "'\napi_version = 'v1'\napi_key = '" + 'a' * 32 + "'\n")
+
+# Definition for starting the mock server in its own process, so it neither competes with the import for the
+# GIL nor ends up in the memory of the forked import processes
+def startmock(args):
+    port = freeport()
+    command = [sys.executable, os.path.join(directory, 'mock_b1ddi.py'), '--port', str(port), '--latency', str(args.latency),
+               '--jitter', str(args.jitter), '--error-rate', str(args.errorrate), '--rate', str(args.rate)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    for attempt in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, 'http://127.0.0.1:' + str(port)
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError('The mock server did not start')
+
+def mockcall(url, method='GET'):
+    with urllib.request.urlopen(urllib.request.Request(url, method=method)) as response:
+        data = response.read()
+    return json.loads(data) if data else None
+
+def countrows(csvfile):
+    with open(csvfile, newline='') as f:
+        return sum(1 for line in f) - 1
+
+# Definition for one import, returns the wall time in seconds and the peak RSS in MB
+def runimport(command):
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = process.stderr.read()
+    pid, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status >> 8
+    if process.returncode:
+        raise RuntimeError(' '.join(command) + ' failed: ' + stderr.decode(errors='replace'))
+    peak = rusage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10) # Bytes on macOS, KB on Linux
+    return elapsed, peak
+
+def measure(url, tmpdir, ini, objtype, csvfile, size, args):
+    mockcall(url + '/_reset', 'POST')
+    journal = os.path.join(tmpdir, objtype + '.journal')
+    command = [sys.executable, script, '-i', 'default', '-c', ini, flags[objtype], csvfile, '-w', str(args.workers), '--journal', journal, '--rejects', os.path.join(tmpdir, objtype + '.rejects.csv')] + shlex.split(args.args)
+    elapsed, peak = runimport(command)
+    stats = mockcall(url + '/_stats')
+    writes, codes = stats['writes'], {int(code): count for code, count in stats['codes'].items()}
+    rows = countrows(csvfile)
+    return {
+        'size': size, 'object_type': objtype, 'rows': rows, 'seconds': round(elapsed, 3), 'objects_per_sec': round(rows / elapsed, 1),
+        'p50_ms': round(writes['p50'] * 1000, 2), 'p99_ms': round(writes['p99'] * 1000, 2),
+        'peak_rss_mb': round(peak, 1), 'throttled': codes.get(429, 0), 'errors': sum(count for code, count in codes.items() if code >= 500),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark csv2b1ddi imports against a local mock B1DDI server')
+    parser.add_argument('--sizes', default='1000,10000', help="Comma separated dataset sizes (number of subnets)")
+    parser.add_argument('--types', help="Comma separated object types (default: all)")
+    parser.add_argument('--workers', type=int, default=16, help="Value for --workers of csv2b1ddi.py")
+    parser.add_argument('--options', type=int, default=5, help="Number of OPTION-DHCP-XXX columns in the networks file")
+    parser.add_argument('--latency', type=float, default=0.02, help="Mean latency of the mock server in seconds")
+    parser.add_argument('--jitter', type=float, default=0.005, help="Standard deviation of the latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, dest='errorrate', help="Fraction of the calls failing with a 500")
+    parser.add_argument('--rate', type=float, default=0.0, help="Rate limit of the mock server in requests per second")
+    parser.add_argument('--args', default='', help="Extra arguments for csv2b1ddi.py, for example \"--gzip --no-validate\"")
+    parser.add_argument('--output', help="Append the results as JSON lines to this file")
+    args = parser.parse_args()
+
+    types = args.types.split(',') if args.types else list(flags)
+    for objtype in types:
+        if objtype not in flags:
+            parser.error('Unknown object type ' + objtype + ', choose from ' + ', '.join(flags))
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    print('{:>8} {:<17} {:>8} {:>8} {:>11} {:>8} {:>8} {:>9} {:>6} {:>6}'.format('size', 'object type', 'rows', 'seconds', 'objects/s', 'p50 ms', 'p99 ms', 'RSS MB', '429', '5xx'))
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csvfiles = generate_csv.generate(tmpdir, size, types, args.options)
+            server, url = startmock(args)
+            ini = os.path.join(tmpdir, 'mock.ini')
+            writeini(ini, url)
+            try:
+                for objtype in types:
+                    result = measure(url, tmpdir, ini, objtype, csvfiles[objtype], size, args)
+                    results.append(result)
+                    print('{size:>8} {object_type:<17} {rows:>8} {seconds:>8.1f} {objects_per_sec:>11.1f} {p50_ms:>8.1f} {p99_ms:>8.1f} {peak_rss_mb:>9.1f} {throttled:>6} {errors:>6}'.format(**result))
+            finally:
+                server.terminate()
+                server.wait()
+    if args.output:
+        with open(args.output, 'a') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+
+if __name__ == '__main__':
+    main()
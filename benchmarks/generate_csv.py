@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Generator for synthetic NIOS CSV exports, one file per object type, matching the reference objects of
+mock_b1ddi.py.
+
+The dataset size is the number of subnets. Every subnet is a /28 in 10.0.0.0/8, so the size can be at most
+1048576. Each /24 address block holds 16 subnets and every subnet gets one DHCP range and one fixed address
+(alternately a reservation and a MAC address). There is one authoritative zone per 1000 records plus the
+reverse zone, and every record type gets one row per subnet.
+
+Usage:
+    python benchmarks/generate_csv.py [--size 10000] [--options 5] [--directory dataset] [--types network,arecord]
+"""
+
+import argparse, csv, ipaddress, os
+
+maxsize = 1 << 20
+base = int(ipaddress.ip_address('10.0.0.0'))
+
+def address(value):
+    return str(ipaddress.ip_address(base + value))
+
+def zone(i):
+    return 'z' + str(i // 1000) + '.example.com'
+
+def networkcontainers(size, options):
+    yield ['header-networkcontainer', 'address*', 'netmask*', 'comment']
+    for i in range((size + 15) // 16):
+        yield ['networkcontainer', address(i << 8), '255.255.255.0', 'Block ' + str(i)]
+
+def networks(size, options):
+    codes = [code for code in range(1, 255) if code not in (3, 6, 15)][:options]
+    yield ['header-network', 'address*', 'netmask*', 'comment', 'dhcp_members', 'domain_name', 'domain_name_servers', 'routers'] + ['OPTION-DHCP-' + str(code) for code in codes]
+    for i in range(size):
+        yield ['network', address(i << 4), '255.255.255.240', 'Subnet ' + str(i), 'dhcp1' if i % 2 else 'ha1', 'example.com', '10.255.255.53', address((i << 4) + 1)] + ['option-' + str(code) for code in codes]
+
+def ranges(size, options):
+    yield ['header-dhcprange', 'start_address*', 'end_address*', 'comment']
+    for i in range(size):
+        yield ['dhcprange', address((i << 4) + 2), address((i << 4) + 11), 'Range ' + str(i)]
+
+def fixedaddresses(size, options):
+    yield ['header-fixedaddress', 'ip_address*', 'match_option', 'mac_address', 'comment']
+    for i in range(size):
+        mac = ':'.join('{:02x}'.format(i >> shift & 255) for shift in (40, 32, 24, 16, 8, 0))
+        yield ['fixedaddress', address((i << 4) + 13), 'MAC_ADDRESS' if i % 2 else 'RESERVED', mac, 'Fixed ' + str(i)]
+
+def authzones(size, options):
+    yield ['header-authzone', 'fqdn*', 'view', 'ns_group', 'comment']
+    yield ['authzone', '10.in-addr.arpa', 'default', 'nsg1', 'Reverse zone']
+    for i in range(0, size, 1000):
+        yield ['authzone', zone(i), 'default', 'nsg1', 'Zone ' + str(i // 1000)]
+
+def records(rrtype, columns, rdata):
+    def generate(size, options):
+        yield ['header-' + rrtype] + columns + ['view', 'comment']
+        for i in range(size):
+            yield [rrtype] + rdata(i) + ['default', rrtype + ' ' + str(i)]
+    return generate
+
+def ptrname(i):
+    return '.'.join(reversed(address((i << 4) + 1).split('.'))) + '.in-addr.arpa'
+
+generators = {
+    'networkcontainer': networkcontainers,
+    'network': networks,
+    'dhcprange': ranges,
+    'fixedaddress': fixedaddresses,
+    'authzone': authzones,
+    'arecord': records('arecord', ['fqdn*', 'address*'], lambda i: ['a' + str(i) + '.' + zone(i), address((i << 4) + 1)]),
+    'txtrecord': records('txtrecord', ['fqdn*', 'text*'], lambda i: ['t' + str(i) + '.' + zone(i), 'v=spf1 -all ' + str(i)]),
+    'mxrecord': records('mxrecord', ['fqdn*', 'mx*', 'priority*'], lambda i: [zone(i), 'mx' + str(i) + '.' + zone(i), str(10 + i % 10)]),
+    'ptrrecord': records('ptrrecord', ['fqdn', 'dname*'], lambda i: [ptrname(i), 'a' + str(i) + '.' + zone(i)]),
+    'srvrecord': records('srvrecord', ['fqdn*', 'port*', 'priority*', 'target*', 'weight*'], lambda i: ['_sip._tcp.s' + str(i) + '.' + zone(i), '5060', '10', 'a' + str(i) + '.' + zone(i), '5']),
+    'aaaarecord': records('aaaarecord', ['fqdn*', 'address*'], lambda i: ['aaaa' + str(i) + '.' + zone(i), str(ipaddress.ip_address('fd00::') + i)]),
+    'cnamerecord': records('cnamerecord', ['fqdn*', 'canonical_name'], lambda i: ['c' + str(i) + '.' + zone(i), 'a' + str(i) + '.' + zone(i)]),
+}
+
+# Definition for writing the CSV files of the given object types, returns the file per object type
+def generate(directory, size, types=None, options=5):
+    if not 0 < size <= maxsize:
+        raise ValueError('The size needs to be between 1 and ' + str(maxsize))
+    csvfiles = {}
+    for objtype in types or generators:
+        csvfile = os.path.join(directory, objtype + '.csv')
+        with open(csvfile, 'w', newline='') as f:
+            csv.writer(f).writerows(generators[objtype](size, options))
+        csvfiles[objtype] = csvfile
+    return csvfiles
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic NIOS CSV files for benchmarking csv2b1ddi')
+    parser.add_argument('--size', type=int, default=10000, help="Number of subnets, the other object types scale with it")
+    parser.add_argument('--options', type=int, default=5, help="Number of OPTION-DHCP-XXX columns in the networks file")
+    parser.add_argument('--directory', default='.', help="Directory to write the CSV files to")
+    parser.add_argument('--types', help="Comma separated object types (default: all)")
+    args = parser.parse_args()
+
+    types = args.types.split(',') if args.types else None
+    for objtype in types or ():
+        if objtype not in generators:
+            parser.error('Unknown object type ' + objtype + ', choose from ' + ', '.join(generators))
+    os.makedirs(args.directory, exist_ok=True)
+    try:
+        csvfiles = generate(args.directory, args.size, types, args.options)
+    except ValueError as e:
+        parser.error(str(e))
+    for objtype, csvfile in csvfiles.items():
+        print(objtype + ': ' + csvfile)
+
+if __name__ == '__main__':
+    main()
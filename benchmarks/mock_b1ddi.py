@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the B1DDI endpoints csv2b1ddi.py uses, to measure imports without a CSP tenant.
+
+Objects are kept in memory, listing calls support _filter (field=="value"), _fields, _limit and _offset,
+POST creates an object and PATCH updates it. Gzip compressed request bodies are accepted. The reference
+objects (IP space default, DNS view default, NS group nsg1, DHCP host dhcp1, HA group ha1, DNS host ns1
+and all DHCP option codes) exist from the start.
+
+The latency of every call, the fraction of calls failing with a 500 and a rate limit answered with 429 and
+Retry-After can be configured. The time between reading a request and writing its response is recorded per
+method and endpoint, GET /_stats returns the counts and p50/p99 latencies per endpoint and for all create
+and update calls together, POST /_reset clears them.
+
+Usage:
+    python benchmarks/mock_b1ddi.py [--port 8080] [--latency 0.02] [--jitter 0.01] [--error-rate 0.01] [--rate 100]
+
+Point the ini file at it with url = 'http://127.0.0.1:8080' and any 32 character api_key.
+"""
+
+import argparse, gzip, json, math, random, threading, time, uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+prefix = '/api/ddi/v1'
+endpoints = ['/ipam/ip_space', '/ipam/address_block', '/ipam/subnet', '/ipam/range', '/ipam/address', '/dhcp/fixed_address',
+             '/dhcp/option_code', '/dhcp/host', '/dhcp/ha_group', '/dns/view', '/dns/auth_nsg', '/dns/auth_zone', '/dns/record', '/dns/host']
+
+# Definition for the objects every tenant has before the import
+def seed():
+    return {
+        '/ipam/ip_space': [{'name': 'default'}],
+        '/dns/view': [{'name': 'default'}],
+        '/dns/auth_nsg': [{'name': 'nsg1'}],
+        '/dhcp/host': [{'name': 'dhcp1'}],
+        '/dhcp/ha_group': [{'name': 'ha1'}],
+        '/dns/host': [{'name': 'ns1'}],
+        '/dhcp/option_code': [{'code': code, 'name': 'option-' + str(code), 'option_space': 'dhcp4'} for code in range(1, 255)],
+    }
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(fraction * len(values))) - 1)]
+
+def summary(values):
+    return {'count': len(values), 'p50': percentile(values, 0.5), 'p99': percentile(values, 0.99)}
+
+class MockB1DDI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=8080, latency=0.0, jitter=0.0, errorrate=0.0, rate=0.0):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.latency, self.jitter, self.errorrate, self.rate = latency, jitter, errorrate, rate
+        self.lock = threading.Lock()
+        self.objects = {}
+        for endpoint in endpoints:
+            self.objects[endpoint] = {}
+        for endpoint, objects in seed().items():
+            for obj in objects:
+                self.add(endpoint, obj)
+        self.tokens = rate
+        self.last = time.monotonic()
+        self.reset()
+
+    def add(self, endpoint, obj):
+        obj['id'] = endpoint.strip('/') + '/' + str(uuid.uuid4())
+        if 'absolute_name_spec' in obj: # B1DDI returns the absolute name of a record as well
+            obj['dns_absolute_name_spec'] = obj['absolute_name_spec'].rstrip('.') + '.'
+        self.objects[endpoint][obj['id']] = obj
+        return obj
+
+    def reset(self):
+        with self.lock:
+            self.latencies = {}
+            self.codes = {}
+
+    def record(self, key, code, elapsed):
+        with self.lock:
+            self.latencies.setdefault(key, []).append(elapsed)
+            self.codes[code] = self.codes.get(code, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            calls = {key: summary(values) for key, values in self.latencies.items()}
+            writes = summary([value for key, values in self.latencies.items() if key.startswith(('POST', 'PATCH')) for value in values])
+            return {'calls': calls, 'writes': writes, 'codes': {str(code): count for code, count in self.codes.items()}}
+
+    # Definition for the rate limit, a token bucket holding one second worth of requests
+    def throttled(self):
+        if not self.rate:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+            return False
+
+    def wait(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the CSP
+    disable_nagle_algorithm = True # Headers and body are written separately, don't wait for the delayed ACK
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, code, obj=None, headers=()):
+        data = json.dumps(obj).encode() if obj is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for header, value in headers:
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(data)
+        return code
+
+    def error(self, code, message, headers=()):
+        return self.send(code, {'error': [{'message': message}]}, headers)
+
+    def body(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data)
+
+    # Definition for splitting a request path into the endpoint and the object ID
+    def route(self, path):
+        if not path.startswith(prefix):
+            return None, None
+        path = path[len(prefix):]
+        if path in self.server.objects:
+            return path, None
+        endpoint, _, id = path.rpartition('/')
+        if endpoint in self.server.objects:
+            return endpoint, endpoint.strip('/') + '/' + id
+        return None, None
+
+    def handle_call(self, method):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path == '/_stats':
+            return self.send(200, self.server.stats())
+        if url.path == '/_reset':
+            self.server.reset()
+            return self.send(204)
+        endpoint, id = self.route(url.path)
+        try:
+            body = self.body() if method in ('POST', 'PATCH') else None
+        except ValueError as e:
+            body = e
+        if self.server.throttled():
+            code = self.error(429, 'Too many requests', [('Retry-After', '1')])
+        else:
+            self.server.wait()
+            if endpoint is None:
+                code = self.error(404, 'Unknown endpoint ' + url.path)
+            elif random.random() < self.server.errorrate:
+                code = self.error(500, 'Internal server error')
+            elif isinstance(body, ValueError):
+                code = self.error(400, 'Invalid JSON: ' + str(body))
+            elif method == 'GET':
+                code = self.list(endpoint, id, parse_qs(url.query))
+            elif method == 'POST':
+                with self.server.lock:
+                    obj = self.server.add(endpoint, body)
+                code = self.send(201, {'result': obj})
+            else:
+                code = self.update(endpoint, id, body)
+        self.server.record(method + ' ' + (endpoint or url.path), code, time.perf_counter() - start)
+
+    def list(self, endpoint, id, params):
+        with self.server.lock:
+            if id is not None:
+                obj = self.server.objects[endpoint].get(id)
+                return self.send(200, {'result': obj}) if obj else self.error(404, 'Object not found')
+            results = list(self.server.objects[endpoint].values())
+        if '_filter' in params:
+            field, _, value = params['_filter'][0].partition('==')
+            value = value.strip('"')
+            results = [obj for obj in results if str(obj.get(field.strip())) == value]
+        offset = int(params.get('_offset', ['0'])[0])
+        if '_limit' in params:
+            results = results[offset:offset + int(params['_limit'][0])]
+        if '_fields' in params:
+            fields = params['_fields'][0].split(',')
+            results = [{field: obj[field] for field in fields if field in obj} for obj in results]
+        return self.send(200, {'results': results})
+
+    def update(self, endpoint, id, body):
+        with self.server.lock:
+            obj = self.server.objects[endpoint].get(id)
+            if obj is None:
+                return self.error(404, 'Object not found')
+            obj.update(body)
+        return self.send(200, {'result': obj})
+
+    def do_GET(self):
+        self.handle_call('GET')
+
+    def do_POST(self):
+        self.handle_call('POST')
+
+    def do_PATCH(self):
+        self.handle_call('PATCH')
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of the B1DDI API for benchmarking csv2b1ddi')
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on (127.0.0.1 only)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean latency of every call in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Standard deviation of the latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, dest='errorrate', help="Fraction of the calls failing with a 500")
+    parser.add_argument('--rate', type=float, default=0.0, help="Requests per second before answering 429 (default: no limit)")
+    args = parser.parse_args()
+
+    server = MockB1DDI(args.port, args.latency, args.jitter, args.errorrate, args.rate)
+    print('Mock B1DDI listening on http://127.0.0.1:' + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -21,7 +21,7 @@ ToDo:
 - Add error checking
 """
 
-import csv, sys, bloxone, argparse, ipaddress, re, json
+import csv, sys, bloxone, argparse, ipaddress, re, json, threading, queue, concurrent.futures, hashlib, sqlite3, time, bisect, collections, random, gzip, email.utils, requests, urllib3, os, datetime, zlib, subprocess
 
 # Parse CLI arguments and provide help and version information
 parser = argparse.ArgumentParser(description='This is a simple NIOS to B1DDI migration tool', prog='csv2b1ddi')
@@ -37,354 +37,1857 @@ parser.add_argument('-p', '--ptrrecord', action="store", dest="ptrrecord", help=
 parser.add_argument('-s', '--srvrecord', action="store", dest="srvrecord", help="CSV file with SRV record data")
 parser.add_argument('--aaaa', action="store", dest="aaaarecord", help="CSV file with AAAA record data")
 parser.add_argument('--cname', action="store", dest="cnamerecord", help="CSV file with AAAA record data")
+parser.add_argument('--export', action="store", dest="export", help="Combined NIOS grid export with a header line before every object type, instead of a CSV file per object type")
 parser.add_argument('--tags', action="store", dest="tags", help="Tags to apply to imported objects")
-parser.add_argument('-i', '--ipspace', action="store", dest="ipspace", help="Name of IP space to import data in", required=True)
-parser.add_argument('-c', '--config', action="store", dest="config", help="Path to ini file with API key", required=True)
+parser.add_argument('-w', '--workers', action="store", dest="workers", type=int, default=1, help="Number of create requests to keep in flight per object type")
+parser.add_argument('--ordered', action="store_true", dest="ordered", help="Write the results in the original CSV row order when using multiple workers")
+parser.add_argument('--plan', action="store_true", dest="plan", help="Show the import plan and its critical path without importing")
+parser.add_argument('--journal', action="store", dest="journal", default="csv2b1ddi.journal", help="SQLite file recording the result of every row (default: csv2b1ddi.journal)")
+parser.add_argument('--resume', action="store_true", dest="resume", help="Skip the rows the journal records as created by an earlier run")
+parser.add_argument('--validate-only', action="store_true", dest="validateonly", help="Only validate the IPAM CSV files offline and write the rejected rows")
+parser.add_argument('--no-validate', action="store_false", dest="validate", help="Import without validating the IPAM CSV files first")
+parser.add_argument('--rejects', action="store", dest="rejects", default="csv2b1ddi.rejects.csv", help="CSV file for the rows rejected by validation (default: csv2b1ddi.rejects.csv)")
+parser.add_argument('--results', action="store", dest="results", default="csv2b1ddi.results.jsonl", help="JSON lines file with the result of every row (default: csv2b1ddi.results.jsonl)")
+parser.add_argument('--progress', action="store", dest="progress", type=float, default=10, help="Seconds between the progress lines (default: 10)")
+parser.add_argument('--metrics', action="store", dest="metrics", help="Prometheus textfile to write the run metrics to, updated with every progress line")
+parser.add_argument('--sync', action="store_true", dest="sync", help="Only create missing objects and update changed ones, based on the objects already in B1DDI")
+parser.add_argument('--rate', action="store", dest="rate", type=float, default=0, help="Maximum number of requests per second (default: adapt to the 429 responses of B1DDI)")
+parser.add_argument('--retries', action="store", dest="retries", type=int, default=8, help="Number of retries for throttled, failed or timed out requests (default: 8)")
+parser.add_argument('--gzip', action="store_true", dest="gzip", help="Send request bodies compressed with gzip")
+parser.add_argument('--shard', action="store", dest="shard", help="Only import shard K of N, as K/N: shard 0 holds the address blocks and zones, shards 1 to N the other rows")
+parser.add_argument('--processes', action="store", dest="processes", type=int, default=0, help="Import in N processes on this machine, shard 0 first and then shards 1 to N at the same time")
+parser.add_argument('--verify', action="store", dest="verify", nargs='?', const="csv2b1ddi.verify.jsonl", help="Compare the objects in B1DDI with the CSV files without importing and write the differences to this JSON lines file (default: csv2b1ddi.verify.jsonl)")
+parser.add_argument('--merge', action="store", dest="merge", nargs='+', help="Only print the combined report of the results files of several shards")
+parser.add_argument('-i', '--ipspace', action="store", dest="ipspace", help="Name of IP space to import data in (required)")
+parser.add_argument('-c', '--config', action="store", dest="config", help="Path to ini file with API key (required)")
 parser.add_argument('-v', '--version', action='version', version='%(prog)s 0.3')
-options = parser.parse_args()
-
-# Parse the API options including URL, version and API key
-b1ddi = bloxone.b1ddi(options.config)
-
-# Get the IP space that we will import data in (Network View)
-ipspacePath = b1ddi.get_id('/ipam/ip_space', key="name", value=options.ipspace, include_path=True)
-print('The IP space used is ' + options.ipspace + ' with the following path: ' + ipspacePath)
-
-if options.tags:
-    tags = '"tags":' + options.tags
-else:
-    tags = '"tags":{""}'
-
-jsonTags = json.loads(json.dumps(tags))
-
-# Create and populate dictionary containing DHCP Option Codes
-optionDict = {}
-optioncodes = b1ddi.get('/dhcp/option_code', _fields='code,id')
-jsonOptioncodes = optioncodes.json()['results']
-for item in jsonOptioncodes:
-    code = item['code']
-    id = item['id']
-    optionDict.update( {code:id} )
-
-# Create and populate dictionary containing DHCP Hosts (Servers)
-dhcphostDict = {}
-dhcphosts = b1ddi.get('/dhcp/host', _fields='name,id')
-hagroup = b1ddi.get('/dhcp/ha_group', _fields='name,id')
-jsonDhcphosts = dhcphosts.json()['results']
-jsonHagroup = hagroup.json()['results']
-for item in jsonDhcphosts:
-    name = item['name']
-    id = item['id']
-    dhcphostDict.update({name: id})
-
-def dnsserverDict():
-    dnsservers = {}
-    dnshosts = b1ddi.get('/dns/host', _fields='name,id')
-    jsonDnshosts = dnshosts.json()['results']
-    for item in jsonDnshosts:
-        name = item['name']
-        id = item['id']
-        dnsservers.update({name: id})
-    return dnsservers
-
-# Defition for DHCP Hosts and HA Groups to dictionary for lookup
-def dhcpserverDict():
-    dhcpservers = {}
-    dhcphosts = b1ddi.get('/dhcp/host', _fields='name,id')
-    hagroup = b1ddi.get('/dhcp/ha_group', _fields='name,id')
-    listDhcphosts = dhcphosts.json()['results']
-    listHagroups = hagroup.json()['results']
-    serversList = listDhcphosts + listHagroups
-    for item in serversList:
-        name = item['name']
-        id = item['id']
-        dhcpservers.update({name: id})
-    return dhcpservers
-
-# Definition for finding DHCP host ID from dictionary
-def getDhcphostid(name):
+
+# Definition for a client side token bucket shared by all requests. Without --rate nothing is limited until
+# B1DDI answers 429, after that the rate drops to 70% of the rate observed before and grows again by 5% (at
+# least one request) per second without throttling. A Retry-After header pauses all requests.
+class TokenBucket:
+    def __init__(self, rate=0):
+        self.ceiling = rate
+        self.rate = rate
+        self.tokens = 1.0
+        self.last = time.monotonic()
+        self.paused = 0.0
+        self.cooldown = 0.0
+        self.sent = collections.deque(maxlen=200)
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused:
+                    wait = self.paused - now
+                elif not self.rate:
+                    self.sent.append(now)
+                    return
+                else:
+                    self.tokens = min(max(1.0, self.rate / 10), self.tokens + (now - self.last) * self.rate)
+                    self.last = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.sent.append(now)
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def observed(self):
+        if len(self.sent) < 2 or self.sent[-1] == self.sent[0]:
+            return 0.0
+        return (len(self.sent) - 1) / (self.sent[-1] - self.sent[0])
+
+    def succeeded(self):
+        with self.lock:
+            if self.rate:
+                self.rate += max(1.0, self.rate / 20) / self.rate
+                if self.ceiling:
+                    self.rate = min(self.rate, self.ceiling)
+
+    def throttle(self, retryafter):
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.cooldown: # The requests in flight get their 429 as well, only slow down once for them
+                self.rate = max(1.0, 0.7 * (self.observed() or self.rate or 2.0))
+                self.tokens = 0.0
+                self.last = now
+                self.cooldown = now + max(retryafter, 1.0)
+            self.paused = max(self.paused, now + retryafter)
+
+# Definition for the number of seconds a Retry-After header asks to wait, in seconds or as an HTTP date
+def retryafter(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return 0.0
     try:
-        dhcphostID = dhcpservers[name] # Try to find a DHCP Host with name from CSV
-    except KeyError:
-        dhcphostID = '' # If DHCP Host is not found, leave it empty
-    return dhcphostID
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+# Definition for the connection errors of requests that never reached B1DDI
+def notsent(error):
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+# Definition for the HTTP transport under the bloxone calls. The bloxone module opens a new connection for
+# every request, this subclass sends them over one session with a keep-alive connection pool and gzip.
+# Throttled requests, server errors and connection errors are retried with jittered exponential backoff,
+# so a row only fails on a transient error when all retries are used up. A create (POST) is only retried when
+# B1DDI certainly did not process it, after a 429 or when no connection could be made. After a timeout, a
+# dropped connection or a server error it may exist already and sending it again could create it twice.
+class Transport(bloxone.b1ddi):
+    retrycodes = (429, 500, 502, 503, 504)
+
+    def __init__(self, cfg_file, connections=10, rate=0, retries=8, compress=False):
+        super().__init__(cfg_file)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self.headers)
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        self.bucket = TokenBucket(rate)
+        self.retries = retries
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'retried': 0, 'throttled': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def request(self, method, url, body=None):
+        headers = None
+        if body is not None:
+            body = body.encode()
+            if self.compress and len(body) > 1024: # Small bodies fit in one packet anyway
+                body = gzip.compress(body, compresslevel=1)
+                headers = {'Content-Encoding': 'gzip'}
+        idempotent = method != 'POST'
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.count('requests')
+            try:
+                response = self.session.request(method, url, data=body, headers=headers, timeout=(10, 300))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries or not (idempotent or notsent(e)):
+                    raise
+                wait = 0.0
+            else:
+                if response.status_code not in self.retrycodes:
+                    self.bucket.succeeded()
+                    return response
+                wait = retryafter(response)
+                if response.status_code == 429:
+                    self.count('throttled') # Also the last attempt slows the other requests down
+                    self.bucket.throttle(wait)
+                if attempt == self.retries or not (idempotent or response.status_code == 429):
+                    return response
+            attempt += 1
+            self.count('retried')
+            time.sleep(wait + random.uniform(0, min(30.0, 0.25 * 2 ** attempt))) # Full jitter spreads the retries of all workers
+
+    def _apiget(self, url):
+        return self.request('GET', url)
+
+    def _apipost(self, url, body, headers=""):
+        return self.request('POST', url, body)
+
+    def _apipatch(self, url, body):
+        return self.request('PATCH', url, body)
+
+    def report(self):
+        limit = 'no rate limit' if not self.bucket.rate else 'rate limit ' + str(round(self.bucket.rate, 1)) + '/s'
+        print('Transport: ' + str(self.counts['requests']) + ' requests, ' + str(self.counts['retried']) + ' retried, ' + str(self.counts['throttled']) + ' throttled, ' + limit)
+
+# Definition for a cache of the B1DDI reference objects the CSV rows point to by name (views, NS groups,
+# DHCP hosts/HA groups and option codes). Each collection is fetched with one listing call the first time
+# a CSV row needs it and every later lookup is served from memory.
+class Resolver:
+    collections = {
+        'ipspace': [('/ipam/ip_space', 'name')],
+        'view': [('/dns/view', 'name')],
+        'nsg': [('/dns/auth_nsg', 'name')],
+        'dhcphost': [('/dhcp/host', 'name'), ('/dhcp/ha_group', 'name')],
+        'optioncode': [('/dhcp/option_code', 'code')],
+    }
+
+    def __init__(self, b1ddi):
+        self.b1ddi = b1ddi
+        self.cache = {}
+        self.loads = {}
+        self.hits = {}
+        self.misses = {}
+        self.locks = {collection: threading.Lock() for collection in self.collections}
+
+    def load(self, collection):
+        objects = {}
+        for path, key in self.collections[collection]:
+            response = self.b1ddi.get(path, _fields=key + ',id')
+            self.loads[collection] = self.loads.get(collection, 0) + 1
+            if response.status_code in self.b1ddi.return_codes_ok:
+                for item in response.json()['results']:
+                    objects.update({item[key]: item['id']})
+            else:
+                printline(str(response.status_code) + ' ' + response.text)
+        self.cache[collection] = objects
+        return objects
+
+    # A loaded collection is never changed again and is read without a lock. The hit and miss counts are only
+    # for the report and are not locked either.
+    def lookup(self, collection, name, default=''):
+        objects = self.cache.get(collection)
+        if objects is None:
+            with self.locks[collection]: # Object types are imported in parallel, load every collection only once
+                objects = self.cache.get(collection)
+                if objects is None:
+                    objects = self.load(collection)
+        id = objects.get(name)
+        if id is None:
+            self.misses[collection] = self.misses.get(collection, 0) + 1
+            return default # If the object is not found, leave it empty
+        self.hits[collection] = self.hits.get(collection, 0) + 1
+        return id
+
+    def report(self):
+        for collection in self.collections:
+            if collection in self.loads:
+                print('Resolver ' + collection + ': ' + str(self.loads[collection]) + ' listing calls, ' + str(self.hits.get(collection, 0)) + ' hits, ' + str(self.misses.get(collection, 0)) + ' misses')
+
+# Definition for a compact CSV row: the values are kept in a tuple and looked up by column name through the
+# column index shared by all rows of a file, instead of a dictionary per row
+class Row:
+    __slots__ = ('columns', 'values')
+
+    def __init__(self, columns, values):
+        self.columns = columns
+        self.values = values
 
-def getDnshostid(name):
+    def __getitem__(self, name):
+        index = self.columns[name]
+        if index < len(self.values):
+            return self.values[index]
+        return '' # Short rows are padded with empty values
+
+    def get(self, name, default=None):
+        if name in self.columns:
+            return self[name]
+        return default
+
+    def keys(self):
+        return self.columns.keys()
+
+# Definition for streaming a CSV file row by row, the file is only open while it is being read
+def readcsv(csvfile):
+    with open(csvfile, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = {name: index for index, name in enumerate(header)}
+        for values in reader:
+            if values:
+                yield Row(columns, tuple(values))
+
+# Definition for reading rows in a separate thread into a bounded queue. Reading the next rows overlaps with
+# sending the current ones, and the reader blocks when the queue is full so memory stays flat for any file size.
+# When the consumer stops early the reader stops as well and closes the rows, so the file is closed.
+def prefetch(rows, size=1000):
+    rowqueue = queue.Queue(maxsize=size)
+    finished = object()
+    stopped = threading.Event()
+
+    def put(row):
+        while not stopped.is_set():
+            try:
+                rowqueue.put(row, timeout=1)
+                return True
+            except queue.Full:
+                pass # Check again whether the consumer stopped, the queue is never emptied then
+        return False
+
+    def reader():
+        try:
+            for row in rows:
+                if not put(row):
+                    return
+        except Exception as e:
+            put(e) # Hand read errors to the consumer
+        finally:
+            rows.close()
+        put(finished)
+
+    threading.Thread(target=reader, name='reader', daemon=True).start()
     try:
-        dnshostID = dnsservers[name] # Try to find a DHCP Host with name from CSV
+        while True:
+            row = rowqueue.get()
+            if row is finished:
+                return
+            if isinstance(row, Exception):
+                raise row
+            yield row
+    finally:
+        stopped.set()
+
+# Definition for the CSV files of a run, one file per object type. Every file is streamed on its own, the
+# import reads all of them at the same time.
+class CSVFiles:
+    def __init__(self, csvfiles):
+        self.csvfiles = csvfiles
+
+    def types(self):
+        return list(self.csvfiles)
+
+    # Rows of the given object types as (object type, row number, row), one file after the other
+    def rows(self, objtypes, deps=None):
+        for objtype in objtypes:
+            if objtype in self.csvfiles:
+                for rownum, item in enumerate(readcsv(self.csvfiles[objtype]), start=1):
+                    yield objtype, rownum, item
+
+    # Definition for the rows of the given groups of object types, each group is read when it is iterated
+    def groups(self, *groups):
+        return [self.rows(objtypes) for objtypes in groups]
+
+    # Definition for registering the parent rows of this run before the import, only their keys are kept.
+    # Returns True as all parents are registered.
+    def expect(self, deps, complete=False):
+        for objtype, rownum, item in self.rows([objtype for objtype in self.csvfiles if objtype in deps.keys]):
+            key = deps.keyof(objtype, item)
+            if key is not None:
+                deps.expect(objtype, key)
+        return True
+
+    def streams(self, deps):
+        return {objtype: prefetch(readcsv(csvfile)) for objtype, csvfile in self.csvfiles.items()}
+
+    # Definition for the number of rows in the CSV files, counted from the line ends so the progress line does not
+    # parse every file twice. Quoted values spanning lines make it an estimate, which is good enough for an ETA.
+    def count(self):
+        total = 0
+        for csvfile in self.csvfiles.values():
+            with open(csvfile, 'rb') as f:
+                lines = 0
+                last = b'\n'
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    lines += chunk.count(b'\n')
+                    last = chunk[-1:]
+            total += max(0, lines - (last == b'\n')) # Minus the header line
+        return total
+
+    def fraction(self):
+        return None
+
+    def report(self):
+        pass
+
+# Definition for a combined NIOS grid export with a header-xxx line before every section. The export is read
+# once from start to end and every row goes to the stream of its object type, through a bounded queue per
+# object type so memory stays flat. Rows are numbered per object type, like in the CSV file of that type.
+# A row only waits for a parent that was read before it, parents further down the export are expected to exist.
+class Export:
+    queuesize = 1000
+
+    def __init__(self, exportfile):
+        self.exportfile = exportfile
+        self.size = None
+        self.position = 0
+        self.unsupported = {}
+        self.closed = set()
+
+    def types(self):
+        return list(objecttypes)
+
+    def lines(self, f):
+        for line in f:
+            self.position += len(line)
+            yield line
+
+    # Definition for the supported rows of the export in file order, as (object type, row number, row)
+    def sections(self, deps=None):
+        headers = {}
+        rownums = dict.fromkeys(objecttypes, 0)
+        self.position = 0
+        self.unsupported = {}
+        with open(self.exportfile, 'r', newline='') as f:
+            for values in csv.reader(self.lines(f)):
+                if not values or not values[0]:
+                    continue
+                objtype = values[0].lower()
+                if objtype.startswith('header-'):
+                    headers[objtype[7:]] = {name: index for index, name in enumerate(values)}
+                    continue
+                if objtype not in objecttypes or objtype not in headers:
+                    self.unsupported[objtype] = self.unsupported.get(objtype, 0) + 1
+                    continue
+                rownums[objtype] += 1
+                item = Row(headers[objtype], tuple(values))
+                if deps is not None and objtype in deps.keys:
+                    key = deps.keyof(objtype, item)
+                    if key is not None:
+                        deps.expect(objtype, key) # Before the row is handed on, so its children wait for it
+                yield objtype, rownums[objtype], item
+
+    def rows(self, objtypes, deps=None):
+        for objtype, rownum, item in self.sections(deps):
+            if objtype in objtypes:
+                yield objtype, rownum, item
+
+    # Definition for the rows of the given groups of object types, each group is a read of the export when it is
+    # iterated, so no rows are kept in memory
+    def groups(self, *groups):
+        return [self.rows(objtypes) for objtypes in groups]
+
+    # Parent rows are registered while the export is read, so a row only waits for a parent read before it and
+    # the reader never waits for a row further down. With complete all parents are registered by a read of their
+    # own instead. Returns whether all parents are registered.
+    def expect(self, deps, complete=False):
+        if complete:
+            for row in self.sections(deps):
+                pass
+        return complete
+
+    def streams(self, deps):
+        queues = {objtype: queue.Queue(maxsize=self.queuesize) for objtype in objecttypes}
+        finished = object()
+
+        def route(objtype, row):
+            while objtype not in self.closed:
+                try:
+                    queues[objtype].put(row, timeout=1)
+                    return
+                except queue.Full:
+                    pass # Check again whether the object type stopped, its queue is never emptied then
+
+        def reader():
+            try:
+                for objtype, rownum, item in self.sections(deps):
+                    route(objtype, item)
+            except Exception as e:
+                for objtype in queues:
+                    route(objtype, e) # Hand read errors to every object type
+            for objtype in queues:
+                route(objtype, finished)
+
+        def stream(objtype):
+            try:
+                while True:
+                    row = queues[objtype].get()
+                    if row is finished:
+                        return
+                    if isinstance(row, Exception):
+                        raise row
+                    yield row
+            finally:
+                self.closed.add(objtype)
+
+        threading.Thread(target=reader, name='export', daemon=True).start()
+        return {objtype: stream(objtype) for objtype in queues}
+
+    def count(self):
+        return None # Reading the export is the only pass, the progress follows the read position instead
+
+    def fraction(self):
+        if self.size is None:
+            self.size = os.path.getsize(self.exportfile)
+        return min(1.0, self.position / self.size) if self.size else 1.0
+
+    def report(self):
+        if self.unsupported:
+            print('Skipped rows of object types that are not supported: ' + ', '.join(objtype + ' ' + str(count) for objtype, count in sorted(self.unsupported.items())))
+
+# Definition for the tags applied to every imported object. The escaped form from older versions of this
+# README ({\"OWNER\":\"jneerdael\"}) is accepted as well.
+def parsetags(value):
+    if not value:
+        return {}
+    try:
+        tags = json.loads(value)
+    except ValueError:
+        tags = json.loads(value.replace('\\"', '"'))
+    if not isinstance(tags, dict):
+        raise ValueError('Tags need to be a JSON object')
+    return tags
+
+# Definition for serializing a request body, every body is built as a dictionary and serialized exactly once
+encoder = json.JSONEncoder(separators=(',', ':'))
+
+def serialize(body):
+    return encoder.encode(body)
+
+# Definition for the CIDR of a netmask column, which holds either a prefix length or a dotted netmask
+prefixlens = {}
+
+def getPrefixlen(netmask):
+    try:
+        return prefixlens[netmask]
     except KeyError:
-        dnshostID = '' # If DHCP Host is not found, leave it empty
-    return dnshostID
-
-# Definition for importing CSV and saving it to a dictionary with key, value pairs
-def csv_dict_list(csvfile):
-    reader = csv.DictReader(open(csvfile, 'r'))
-    dict_list = []
-    for line in reader:
-        dict_list.append(line)
-    return dict_list
-
-# Definition for getting DHCP options and putting them in right JSON format
-def getDhcpoptions(csvline):
-    dhcpoptions = {optionDict[15]: csvline['domain_name'], optionDict[6]: csvline['domain_name_servers'], optionDict[3]: csvline['routers']}  # Get DHCP options for values referenced by a name instead of OPTION-XX and save in dictionary
-    for keys in csvline.keys():
-        if re.match('^OPTION-DHCP-(?<!\d)(?:[1-9]?\d|1\d\d|2(?:[0-4]\d|5[0-5]))(?!\d)', keys):  # Search for DHCP options in the format OPTION-XXX
-            code = (re.findall('\d+', keys))  # Extract the DHCP option number
-            codeInteger = int(code[0])  # Convert the DHCP option number to a integer value
-            print(csvline[keys])
-            dhcpoptions.update({optionDict[codeInteger]: csvline[keys]})  # Add the DHCP code integer and value to the dhcpoptions dictionary
-    nonemptydhcpoptions = {k: v for k, v in dhcpoptions.items() if v}  # Remove key/value pairs from DHCP options if value is empty
-    dhcpoptionlist = []  # Create empty list to populate with options
-    for key in nonemptydhcpoptions:
-        dhcpoptionlist.append({"type": "option", "option_code": key, "option_value": nonemptydhcpoptions[key]})  # Append DHCP Options to list when options are not empty
-    jsonOptions = json.dumps(dhcpoptionlist)  # Convert DHCP Options list to JSON
-    return jsonOptions
-
-dhcpservers = dhcpserverDict()
-dnsservers = dnsserverDict()
-
-# Import NIOS CSV for networkcontainers
-def addcontainers(networkcontainers):
-    for item in networkcontainers:
-        cidr = item['netmask*']
-        address = item['address*'] # Put network address in variable
-        comment = item['comment']
-        body = ('{"space":"' + ipspacePath + '","address":"' + address + '","cidr":' + cidr + ',"comment":"' + comment + '",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(json.dumps(body)) # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/ipam/address_block', body=jsonBody) # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
+        if netmask.isdigit():
+            prefixlen = int(netmask)
+        else:
+            prefixlen = ipaddress.ip_network('0.0.0.0/' + netmask).prefixlen # Convert netmask to CIDR
+        prefixlens[netmask] = prefixlen
+        return prefixlen
+
+# DHCP options referenced by a column name instead of OPTION-DHCP-XXX and the OPTION-DHCP-XXX columns
+namedoptions = (('domain_name', 15), ('domain_name_servers', 6), ('routers', 3))
+optioncolumn = re.compile(r'^OPTION-DHCP-(?<!\d)((?:[1-9]?\d|1\d\d|2(?:[0-4]\d|5[0-5]))(?!\d))')
+
+# Definition for the DHCP option plan of a networks CSV header: a list of (option code ID, column index).
+# OPTION-DHCP-XXX columns override the named columns and option codes unknown in B1DDI are left out.
+def compileDhcpoptions(columns, resolver):
+    plan = {}
+    for name, code in namedoptions:
+        if name in columns:
+            plan[resolver.lookup('optioncode', code)] = columns[name]
+    for name, index in columns.items():
+        match = optioncolumn.match(name)
+        if match:
+            plan[resolver.lookup('optioncode', int(match.group(1)))] = index
+    plan.pop('', None)
+    return list(plan.items())
+
+# Definition for printing a line, object types run in parallel so lines are written under a lock to keep
+# them from interleaving
+output = threading.Lock()
+
+def printline(line):
+    with output:
+        print(line)
+
+# Definition for the object ID in the response to a create or update call
+def resultid(text):
+    try:
+        return json.loads(text)['result']['id']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+# Definition for the error message in a failed response, B1DDI returns {"error":[{"message":...}]}
+def errormessage(text):
+    try:
+        return '; '.join(error['message'] for error in json.loads(text)['error'])
+    except (ValueError, KeyError, TypeError):
+        return text[:500]
+
+# Definition for the results of a run. Every row is written as one compact JSON line to the results file
+# through a large write buffer. Counts, failure reasons and latency histograms are kept per object type for
+# the progress line, the summary at the end and the optional Prometheus textfile.
+class Results:
+    actions = ('created', 'updated', 'failed', 'rejected', 'skipped')
+    buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds, the last bucket is +Inf
+
+    def __init__(self, filename, append=False, metrics=None, transport=None, shard=None):
+        self.file = open(filename, 'a' if append else 'w', buffering=1 << 20) if filename is not None else None
+        self.metrics = metrics
+        self.transport = transport
+        self.shard = shard
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.histograms = {}
+        self.reasons = {}
+        self.aborted = {}
+        self.total = None
+        self.source = None
+        self.start = time.monotonic()
+        self.stopped = threading.Event()
+
+    def write(self, objtype, rownum, result):
+        status = id = error = latency = None
+        if result is None:
+            action = 'skipped'
         else:
-            print(response.status_code)
-            print(response.text)
-
-# Import NIOS CSV for network
-def addnetworks(networks):
-    for item in networks:
-        cidr = str(ipaddress.ip_network('0.0.0.0/' + item['netmask*']).prefixlen) # Convert netmask to CIDR
-        address = item['address*'] # Put network address in variable
-        comment = item['comment']
-        dhcphostID = getDhcphostid(item['dhcp_members']) # Get DHCP Host ID
-        jsonDhcpoptions = getDhcpoptions(item) # Get DHCP Options in JSON
-        body = ('{"space":"' + ipspacePath + '","address":"' + address + '","cidr":' + cidr + ',"dhcp_host":"' + dhcphostID + '","comment":"' + comment + '","dhcp_options":' + jsonDhcpoptions + ',' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(json.dumps(body)) # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/ipam/subnet', body=jsonBody) # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
+            status, text, action, latency = result
+            if action == 'rejected':
+                error = text # The reason the validation gave
+            elif 200 <= status < 300:
+                id = resultid(text)
+            else:
+                action = 'failed'
+                error = errormessage(text)
+        line = encoder.encode({'row': rownum, 'type': objtype, 'status': status, 'action': action, 'id': id, 'error': error,
+                               'latency_ms': None if latency is None else round(latency * 1000, 1)})
+        with self.lock:
+            self.file.write(line + '\n')
+            self.count(objtype, status, action, error, latency)
+
+    # Definition for adding one result to the counts, histograms and failure reasons, the lock is held by the caller
+    def count(self, objtype, status, action, error, latency):
+        counts = self.counts.get(objtype)
+        if counts is None:
+            counts = self.counts[objtype] = dict.fromkeys(self.actions, 0)
+            self.histograms[objtype] = [[0] * (len(self.buckets) + 1), 0.0]
+        counts[action] += 1
+        if latency is not None:
+            histogram = self.histograms[objtype]
+            histogram[0][bisect.bisect_left(self.buckets, latency)] += 1
+            histogram[1] += latency
+        if action == 'failed':
+            reason = (objtype, status, error)
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    # Definition for adding the lines of a results file written by another run, read one line at a time
+    def load(self, filename):
+        with open(filename) as f:
+            for line in f:
+                result = json.loads(line)
+                latency = result['latency_ms']
+                with self.lock:
+                    self.count(result['type'], result['status'], result['action'], result['error'], None if latency is None else latency / 1000)
+
+    def finished(self, objtype):
+        counts = self.counts.get(objtype, dict.fromkeys(self.actions, 0))
+        return objtype + ': ' + ', '.join(str(counts[action]) + ' ' + action for action in self.actions)
+
+    def progressline(self):
+        with self.lock:
+            done = sum(sum(counts.values()) for counts in self.counts.values())
+            failed = sum(counts['failed'] for counts in self.counts.values())
+        elapsed = time.monotonic() - self.start
+        rate = done / elapsed if elapsed else 0.0
+        line = 'Progress: ' + str(done)
+        fraction = None
+        if self.total:
+            line += '/' + str(self.total) + ' rows'
+            fraction = min(1.0, done / self.total)
         else:
-            print(response.status_code)
-            print(response.text)
-
-def addranges(ranges):
-    for item in ranges:
-        start = item['start_address*']
-        end = item['end_address*']
-        comment = item['comment']
-        body = ('{"space":"' + ipspacePath + '","start":"' + start + '","end":"' + end + '","comment":"' + comment + '",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(json.dumps(body)) # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/ipam/range', body=jsonBody) # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
+            line += ' rows'
+            fraction = self.source.fraction() if self.source is not None else None # Without a row count, follow the read position
+        if fraction is not None:
+            line += ' (' + str(round(100.0 * fraction, 1)) + '%)'
+        line += ', ' + str(failed) + ' failed, ' + str(round(rate, 1)) + ' rows/sec'
+        if fraction:
+            line += ', ETA ' + str(datetime.timedelta(seconds=round(elapsed * (1 - fraction) / fraction)))
+        return line
+
+    def progress(self, source, interval):
+        self.source = source
+        self.total = source.count() if self.shard is None else None # A shard imports an unknown part of the rows
+        while not self.stopped.wait(interval):
+            printline(self.progressline())
+            if self.metrics:
+                self.writemetrics()
+
+    def run(self, source, interval):
+        self.reporter = threading.Thread(target=self.progress, args=(source, interval), name='progress', daemon=True)
+        self.reporter.start()
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+        if self.metrics:
+            self.writemetrics()
+
+    # Definition for the Prometheus textfile, written to a temporary file and renamed so a scrape never reads half a file
+    def writemetrics(self):
+        shard = '' if self.shard is None else 'shard="' + str(self.shard) + '",' # Shards of one import write separate files with the same series
+        lines = ['# HELP csv2b1ddi_rows_total Rows processed per object type and result', '# TYPE csv2b1ddi_rows_total counter']
+        with self.lock:
+            for objtype, counts in self.counts.items():
+                for action in self.actions:
+                    lines.append('csv2b1ddi_rows_total{' + shard + 'type="' + objtype + '",result="' + action + '"} ' + str(counts[action]))
+            lines += ['# HELP csv2b1ddi_request_duration_seconds Duration of the create and update calls including retries', '# TYPE csv2b1ddi_request_duration_seconds histogram']
+            for objtype, (counts, total) in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append('csv2b1ddi_request_duration_seconds_bucket{' + shard + 'type="' + objtype + '",le="' + str(bound) + '"} ' + str(cumulative))
+                lines.append('csv2b1ddi_request_duration_seconds_sum{' + shard + 'type="' + objtype + '"} ' + repr(round(total, 6)))
+                lines.append('csv2b1ddi_request_duration_seconds_count{' + shard + 'type="' + objtype + '"} ' + str(cumulative))
+        lines += ['# HELP csv2b1ddi_rows_expected Rows in the CSV files of this run', '# TYPE csv2b1ddi_rows_expected gauge',
+                  'csv2b1ddi_rows_expected' + ('{' + shard[:-1] + '}' if shard else '') + ' ' + str(self.total or 0)]
+        if self.transport is not None:
+            lines += ['# HELP csv2b1ddi_http_requests_total HTTP requests sent to B1DDI', '# TYPE csv2b1ddi_http_requests_total counter']
+            for key, count in self.transport.counts.items():
+                lines.append('csv2b1ddi_http_requests_total{' + shard + 'kind="' + key + '"} ' + str(count))
+        lines += ['# HELP csv2b1ddi_last_update_timestamp_seconds Time of the last update of this file', '# TYPE csv2b1ddi_last_update_timestamp_seconds gauge',
+                  'csv2b1ddi_last_update_timestamp_seconds' + ('{' + shard[:-1] + '}' if shard else '') + ' ' + str(round(time.time(), 3))]
+        with open(self.metrics + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(self.metrics + '.tmp', self.metrics)
+
+    # Definition for the number of failed and rejected rows plus the object types that stopped, 0 when the run succeeded
+    def failures(self):
+        with self.lock:
+            return sum(counts['failed'] + counts['rejected'] for counts in self.counts.values()) + len(self.aborted)
+
+    def report(self):
+        print('Summary:')
+        for objtype in self.counts:
+            print('  ' + self.finished(objtype))
+            counts, total = self.histograms[objtype]
+            if sum(counts):
+                bounds = ['<=' + str(int(bound * 1000)) + 'ms' for bound in self.buckets] + ['>' + str(int(self.buckets[-1] * 1000)) + 'ms']
+                print('    latency: ' + ', '.join(bound + ' ' + str(count) for bound, count in zip(bounds, counts) if count) + ' (mean ' + str(round(1000 * total / sum(counts), 1)) + 'ms)')
+        if self.reasons:
+            print('Failure reasons:')
+            for (objtype, status, error), count in sorted(self.reasons.items(), key=lambda reason: -reason[1])[:20]:
+                print('  ' + str(count) + ' x ' + objtype + ' ' + str(status) + ': ' + error)
+            if len(self.reasons) > 20:
+                print('  ' + str(len(self.reasons) - 20) + ' more, see the results file')
+        if self.aborted:
+            print('Stopped object types, their remaining rows were not imported:')
+            for objtype, error in self.aborted.items():
+                print('  ' + objtype + ': ' + error)
+
+# Definition for writing the result of every row of one object type. With ordered output the results are
+# held back until all earlier rows are written, and the in-flight slot of a row is only freed once it is written
+# so the reorder buffer never grows beyond the number of workers.
+class ResultLog:
+    def __init__(self, objtype, slots, results, ordered=False):
+        self.objtype = objtype
+        self.slots = slots
+        self.results = results
+        self.ordered = ordered
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.next = 1
+
+    def write(self, rownum, result):
+        if result is False:
+            return # Row belongs to another shard, it is neither sent nor written
+        if result is None:
+            self.results.write(self.objtype, rownum, result)
+            return # Row was skipped and never sent, its slot is already free
+        try:
+            self.results.write(self.objtype, rownum, result)
+        finally:
+            self.slots.release() # Always free the slot, a failing write must not stall the import
+
+    def done(self, rownum, result):
+        with self.lock:
+            if not self.ordered:
+                self.write(rownum, result)
+                return
+            self.pending[rownum] = result
+            while self.next in self.pending:
+                self.write(self.next, self.pending.pop(self.next))
+                self.next += 1
+
+# Definition for an append-only journal of the result of every row, kept in SQLite in WAL mode. Rows are
+# identified by a hash of their endpoint and body, so a resumed run skips rows created earlier with one set
+# lookup. Records are written by a separate thread in batches, one transaction per batch.
+class Journal:
+    batchsize = 1000
+    interval = 1.0
+
+    def __init__(self, filename, resume=False):
+        self.filename = filename
+        db = self.connect()
+        db.execute('CREATE TABLE IF NOT EXISTS journal (hash INTEGER, objtype TEXT, path TEXT, rownum INTEGER, status INTEGER, id TEXT, error TEXT, time REAL)')
+        self.committed = set()
+        if resume:
+            self.committed = {row[0] for row in db.execute('SELECT hash FROM journal WHERE status BETWEEN 200 AND 299')}
+        db.close()
+        self.records = queue.Queue()
+        self.writer = threading.Thread(target=self.write, name='journal', daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.filename)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    @staticmethod
+    def hash(path, body):
+        digest = hashlib.blake2b((path + '\0' + body).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big', signed=True) # Fits an SQLite INTEGER
+
+    def record(self, hash, objtype, path, rownum, status, text):
+        self.records.put((hash, objtype, path, rownum, status, text, time.time()))
+
+    def write(self):
+        db = self.connect()
+        finished = False
+        while not finished:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batchsize:
+                try:
+                    record = self.records.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    finished = True
+                    break
+                batch.append(self.entry(*record))
+            if batch:
+                with db:
+                    db.executemany('INSERT INTO journal VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        db.close()
+
+    # Definition for the journal entry of a result: the object ID for created rows, the response text otherwise
+    @staticmethod
+    def entry(hash, objtype, path, rownum, status, text, when):
+        id = None
+        error = None
+        if 200 <= status < 300:
+            id = resultid(text)
         else:
-            print(response.status_code)
-            print(response.text)
-
-def addfixed(fixed):
-    for item in fixed:
-        address = item['ip_address*']
-        comment = item['comment']
-        match_type = item['match_option']
-        match_value = item['mac_address']
-        name = item['name']
+            error = text
+        return hash, objtype, path, rownum, status, id, error, when
+
+    def close(self):
+        self.records.put(None)
+        self.writer.join()
+
+# Definition for reading a whole B1DDI collection with paginated listing calls
+def listall(b1ddi, path, pagesize=1000, **params):
+    offset = 0
+    while True:
+        results = listpage(b1ddi, path, pagesize, offset, **params)
+        yield from results
+        if len(results) < pagesize:
+            return
+        offset += pagesize
+
+def listpage(b1ddi, path, pagesize, offset, **params):
+    response = b1ddi.get(path, _limit=str(pagesize), _offset=str(offset), **params)
+    if response.status_code not in b1ddi.return_codes_ok:
+        raise RuntimeError('Listing ' + path + ' failed: ' + str(response.status_code) + ' ' + response.text)
+    return response.json()['results']
+
+# Definition for listing a collection with up to window pages in flight at the same time. Pages are requested by
+# offset and yielded in order until the first page that is not full, so at most window pages are held in memory.
+def listpages(b1ddi, path, executor, window, pagesize=1000, **params):
+    pages = collections.deque(executor.submit(listpage, b1ddi, path, pagesize, page * pagesize, **params) for page in range(window))
+    page = window
+    while pages:
+        results = pages.popleft().result()
+        yield from results
+        if len(results) < pagesize:
+            for future in pages:
+                future.cancel() # Pages after the last one are empty
+            return
+        pages.append(executor.submit(listpage, b1ddi, path, pagesize, page * pagesize, **params))
+        page += 1
+
+# Definitions for comparing CSV values with the values B1DDI returns
+namefields = ('fqdn', 'absolute_name_spec', 'cname', 'dname', 'exchange', 'target')
+addressfields = ('address', 'start', 'end')
+
+def normalize(field, value):
+    if value is None:
+        return ''
+    if field in namefields:
+        return value.lower().rstrip('.')
+    if field in addressfields:
+        try:
+            return ipaddress.ip_address(value).compressed
+        except ValueError:
+            return value
+    if field == 'rdata':
+        return tuple(sorted((key, normalize(key, item)) for key, item in value.items()))
+    if field == 'dhcp_options':
+        return tuple(sorted((option.get('option_code'), option.get('option_value')) for option in value if option.get('type') == 'option'))
+    if field == 'nsgs':
+        return tuple(sorted(value))
+    if field == 'tags':
+        return tuple(sorted((key, str(item)) for key, item in value.items()))
+    return value
+
+# Definition for the objects that already exist in B1DDI, used by --sync to only send missing or changed rows.
+# Every endpoint is indexed per IP space or view the first time a row needs it: address blocks and subnets by
+# prefix, ranges by start and end address, addresses by address, zones by FQDN and records by (FQDN, type,
+# rdata). The index keeps the object ID and a fingerprint of the fields the import sets.
+class Sync:
+    # Endpoint: (field scoping the listing, fields identifying an object, fields compared for changes)
+    specs = {
+        '/ipam/address_block': ('space', ('address', 'cidr'), ('comment', 'tags')),
+        '/ipam/subnet': ('space', ('address', 'cidr'), ('dhcp_host', 'comment', 'dhcp_options', 'tags')),
+        '/ipam/range': ('space', ('start', 'end'), ('comment', 'tags')),
+        '/ipam/address': ('space', ('address',), ('comment', 'tags')),
+        '/dhcp/fixed_address': ('ip_space', ('address',), ('match_type', 'match_value', 'comment', 'tags')),
+        '/dns/auth_zone': ('view', ('fqdn',), ('nsgs', 'comment', 'tags')),
+        '/dns/record': ('view', ('absolute_name_spec', 'type', 'rdata'), ('comment', 'tags')),
+    }
+    # Fields B1DDI returns in another form than they are sent, existing records carry their name here
+    aliases = {'absolute_name_spec': 'dns_absolute_name_spec'}
+
+    def __init__(self, b1ddi):
+        self.b1ddi = b1ddi
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.indexes = {}
+
+    def key(self, path, obj):
+        return tuple(normalize(field, obj.get(self.aliases.get(field)) or obj.get(field)) for field in self.specs[path][1])
+
+    def fingerprint(self, path, obj):
+        return hash(tuple(normalize(field, obj.get(field)) for field in self.specs[path][2]))
+
+    # Fields to list: the ID, the fields identifying and compared and the form B1DDI returns them in
+    def listfields(self, path):
+        scopefield, keyfields, fields = self.specs[path]
+        return ','.join(sorted({'id'}.union(keyfields, fields, (self.aliases[field] for field in keyfields if field in self.aliases))))
+
+    def index(self, path, scope):
+        with self.lock:
+            lock = self.loading.setdefault((path, scope), threading.Lock())
+        with lock: # Other rows of the same endpoint and scope wait for the index instead of loading it again
+            index = self.indexes.get((path, scope))
+            if index is None:
+                index = self.load(path, scope)
+        return index
+
+    def load(self, path, scope):
+        index = {}
+        for obj in listall(self.b1ddi, path, _filter=self.specs[path][0] + '=="' + scope + '"', _fields=self.listfields(path)):
+            index[self.key(path, obj)] = (obj['id'], self.fingerprint(path, obj))
+        self.indexes[(path, scope)] = index
+        printline('Indexed ' + str(len(index)) + ' existing objects of ' + path + ' in ' + scope)
+        return index
+
+    # Definition for what to send for a row: the create body, the changed fields with the ID to update or None
+    def diff(self, path, body):
+        scopefield, keyfields, fields = self.specs[path]
+        existing = self.index(path, body[scopefield]).get(self.key(path, body))
+        if existing is None:
+            return path, body, None
+        id, fingerprint = existing
+        if fingerprint == self.fingerprint(path, body):
+            return path, None, None
+        return path, {field: body[field] for field in fields}, id
+
+# Definition for comparing the objects in B1DDI with the CSV files, without changing anything. The CSV rows are
+# mapped to their bodies as for the import and the objects of every IP space or view the rows use are listed
+# with several pages in flight. Both are streamed into a temporary SQLite file, with a 64 bit hash of the
+# endpoint, scope and the fields identifying the object (as for --sync) and a 4 byte hash per compared field,
+# so memory stays bounded for millions of objects. Missing, extra and mismatched objects are found by indexed
+# queries and written as JSON lines. Listed records of a type that is not in the CSV files (SOA, NS) are ignored.
+class Verifier(Sync):
+    batchsize = 10000
+
+    def __init__(self, migrator):
+        super().__init__(migrator.b1ddi)
+        self.migrator = migrator
+        self.db = sqlite3.connect('') # Private temporary file, removed on close
+        self.db.execute('CREATE TABLE local (key INTEGER, fields BLOB, name TEXT, path TEXT, objtype TEXT, rownum INTEGER)')
+        self.db.execute('CREATE TABLE remote (key INTEGER, fields BLOB, name TEXT, path TEXT, id TEXT)')
+        self.db.execute('CREATE TABLE generated (key INTEGER)') # Addresses B1DDI creates itself, never extra
+        self.scopes = {}
+        self.counts = {}
+        self.mismatches = {}
+        self.invalid = 0
+
+    @staticmethod
+    def digest(value, size):
+        return hashlib.blake2b(repr(value).encode(), digest_size=size).digest()
+
+    def hashkey(self, path, scope, key):
+        return int.from_bytes(self.digest((path, scope, key), 8), 'big', signed=True) # Fits an SQLite INTEGER
+
+    def entry(self, path, scope, obj):
+        key = self.key(path, obj)
+        fields = b''.join(self.digest(normalize(field, obj.get(field)), 4) for field in self.specs[path][2])
+        return self.hashkey(path, scope, key), fields, self.describe(path, key)
+
+    @staticmethod
+    def describe(path, key):
+        if path in ('/ipam/address_block', '/ipam/subnet'):
+            return str(key[0]) + '/' + str(key[1])
+        if path == '/ipam/range':
+            return key[0] + '-' + key[1]
+        if path == '/dns/record':
+            return key[0] + ' ' + key[1] + ' ' + ' '.join(str(value) for field, value in key[2])
+        return str(key[0])
+
+    def count(self, path, name, count=1):
+        counts = self.counts.setdefault(path, dict.fromkeys(('csv', 'b1ddi', 'missing', 'extra', 'mismatched'), 0))
+        counts[name] += count
+
+    def insert(self, table, rows):
+        self.db.executemany('INSERT INTO ' + table + ' VALUES (' + ','.join('?' * len(rows[0])) + ')', rows)
+        rows.clear()
+
+    # Definition for the bodies of the CSV rows, mapped by the compile functions of the import
+    def loadrows(self):
+        source = self.migrator.source
+        builders = {}
+        rows = []
+        for objtype, rownum, item in source.rows(source.types()):
+            columns, build, width = builders.get(objtype, (None, None, 0))
+            if item.columns is not columns:
+                columns = item.columns
+                build, width = objecttypes[objtype][1](columns, self.migrator), len(columns)
+                builders[objtype] = columns, build, width
+            values = item.values
+            if len(values) < width:
+                values += ('',) * (width - len(values))
+            try:
+                job = build(values)
+            except ValueError:
+                self.invalid += 1 # Rejected by the import as well
+                continue
+            if job is None:
+                continue
+            path, body = job
+            scope = body[self.specs[path][0]]
+            types = self.scopes.setdefault((path, scope), set())
+            if path == '/dns/record':
+                types.add(body['type'])
+            rows.append(self.entry(path, scope, body) + (path, objtype, rownum))
+            self.count(path, 'csv')
+            if len(rows) >= self.batchsize:
+                self.insert('local', rows)
+        if rows:
+            self.insert('local', rows)
+
+    # Definition for the objects in B1DDI of every endpoint and IP space or view used by the CSV rows. Addresses
+    # are listed with their usage, the ones that are not reserved (leases for example) are left out of the extras.
+    def loadobjects(self, executor, window):
+        for (path, scope), types in self.scopes.items():
+            if path == '/ipam/address':
+                self.loadgenerated(executor, window, scope)
+            rows = []
+            generated = []
+            listed = 0
+            fields = self.listfields(path) + (',usage' if path == '/ipam/address' else '')
+            for obj in listpages(self.b1ddi, path, executor, window, _filter=self.specs[path][0] + '=="' + scope + '"', _fields=fields):
+                listed += 1
+                if types and obj.get('type') not in types:
+                    continue
+                rows.append(self.entry(path, scope, obj) + (path, obj['id']))
+                if obj.get('usage') and 'IPAM RESERVED' not in obj['usage']:
+                    generated.append((rows[-1][0],))
+                self.count(path, 'b1ddi')
+                if len(rows) >= self.batchsize:
+                    self.insert('remote', rows)
+                if len(generated) >= self.batchsize:
+                    self.insert('generated', generated)
+            if rows:
+                self.insert('remote', rows)
+            if generated:
+                self.insert('generated', generated)
+            printline('Listed ' + str(listed) + ' objects of ' + path + ' in ' + scope)
+
+    # Definition for the addresses B1DDI creates in an IP space for its subnets (network and broadcast address)
+    # and fixed addresses, they are not extra when no CSV row describes them
+    def loadgenerated(self, executor, window, scope):
+        addresses = []
+        for obj in listpages(self.b1ddi, '/ipam/subnet', executor, window, _filter='space=="' + scope + '"', _fields='address,cidr'):
+            try:
+                network = ipaddress.ip_network(obj['address'] + '/' + str(obj['cidr']), strict=False)
+            except (KeyError, ValueError):
+                continue
+            if network.version == 4 and network.num_addresses > 2:
+                addresses += [str(network.network_address), str(network.broadcast_address)]
+            if len(addresses) >= self.batchsize:
+                self.insertgenerated(scope, addresses)
+        for obj in listpages(self.b1ddi, '/dhcp/fixed_address', executor, window, _filter='ip_space=="' + scope + '"', _fields='address'):
+            addresses.append(obj.get('address'))
+            if len(addresses) >= self.batchsize:
+                self.insertgenerated(scope, addresses)
+        if addresses:
+            self.insertgenerated(scope, addresses)
+
+    def insertgenerated(self, scope, addresses):
+        self.insert('generated', [(self.hashkey('/ipam/address', scope, self.key('/ipam/address', {'address': address})),) for address in addresses])
+        addresses.clear()
+
+    # Definition for writing the differences to a JSON lines file, returns the number of differences
+    def compare(self, filename):
+        db = self.db
+        db.execute('CREATE INDEX localkey ON local (key)')
+        db.execute('CREATE INDEX remotekey ON remote (key)')
+        db.execute('CREATE INDEX generatedkey ON generated (key)')
+        differences = 0
+        with open(filename, 'w', buffering=1 << 20) as f:
+            for path, objtype, rownum, name in db.execute('SELECT path, objtype, rownum, name FROM local WHERE NOT EXISTS (SELECT 1 FROM remote WHERE remote.key = local.key)'):
+                f.write(encoder.encode({'result': 'missing', 'endpoint': path, 'type': objtype, 'row': rownum, 'object': name}) + '\n')
+                self.count(path, 'missing')
+                differences += 1
+            for path, id, name in db.execute('SELECT path, id, name FROM remote WHERE NOT EXISTS (SELECT 1 FROM local WHERE local.key = remote.key) '
+                                             'AND NOT EXISTS (SELECT 1 FROM generated WHERE generated.key = remote.key)'):
+                f.write(encoder.encode({'result': 'extra', 'endpoint': path, 'id': id, 'object': name}) + '\n')
+                self.count(path, 'extra')
+                differences += 1
+            for path, objtype, rownum, id, name, local, remote in db.execute('SELECT local.path, objtype, rownum, id, local.name, local.fields, remote.fields FROM local JOIN remote ON remote.key = local.key WHERE local.fields != remote.fields'):
+                fields = [field for i, field in enumerate(self.specs[path][2]) if local[4 * i:4 * i + 4] != remote[4 * i:4 * i + 4]]
+                f.write(encoder.encode({'result': 'mismatched', 'endpoint': path, 'type': objtype, 'row': rownum, 'id': id, 'object': name, 'fields': fields}) + '\n')
+                self.count(path, 'mismatched')
+                for field in fields:
+                    self.mismatches[(path, field)] = self.mismatches.get((path, field), 0) + 1
+                differences += 1
+        db.close()
+        return differences
+
+    def report(self):
+        print('Verification:')
+        for path, counts in self.counts.items():
+            print('  ' + path + ': ' + ', '.join(str(count) + ' ' + ('in ' + name if name in ('csv', 'b1ddi') else name) for name, count in counts.items()))
+        for (path, field), count in sorted(self.mismatches.items(), key=lambda mismatch: -mismatch[1]):
+            print('  ' + str(count) + ' x ' + path + ' ' + field + ' differs')
+        if self.invalid:
+            print('  ' + str(self.invalid) + ' invalid rows are not compared')
+
+# The compile functions below run once per CSV header. They resolve the column positions and everything that
+# is the same for every row (through the migrator: IP space, tags and the reference objects), and return a
+# function mapping the values of one row to its endpoint and body.
+def buildcontainer(columns, migrator):
+    address, netmask, comment = columns['address*'], columns['netmask*'], columns['comment']
+    space, tags = migrator.ipspace(), migrator.tags
+
+    def build(values):
+        body = {'space': space, 'address': values[address], 'cidr': getPrefixlen(values[netmask]), 'comment': values[comment], 'tags': tags}
+        return '/ipam/address_block', body
+    return build
+
+def buildnetwork(columns, migrator):
+    address, netmask, comment = columns['address*'], columns['netmask*'], columns['comment']
+    members = columns['dhcp_members']
+    space, tags, resolver = migrator.ipspace(), migrator.tags, migrator.resolver
+    dhcpoptions = compileDhcpoptions(columns, resolver)
+
+    def build(values):
+        dhcpoptionlist = [{'type': 'option', 'option_code': code, 'option_value': values[index]} for code, index in dhcpoptions if values[index]]  # Only options with a value
+        body = {'space': space, 'address': values[address], 'cidr': getPrefixlen(values[netmask]), 'dhcp_host': resolver.lookup('dhcphost', values[members]), 'comment': values[comment], 'dhcp_options': dhcpoptionlist, 'tags': tags}
+        return '/ipam/subnet', body
+    return build
+
+def buildrange(columns, migrator):
+    start, end, comment = columns['start_address*'], columns['end_address*'], columns['comment']
+    space, tags = migrator.ipspace(), migrator.tags
+
+    def build(values):
+        body = {'space': space, 'start': values[start], 'end': values[end], 'comment': values[comment], 'tags': tags}
+        return '/ipam/range', body
+    return build
+
+def buildfixed(columns, migrator):
+    address, comment = columns['ip_address*'], columns['comment']
+    match_option, mac_address = columns['match_option'], columns['mac_address']
+    space, tags = migrator.ipspace(), migrator.tags
+
+    def build(values):
+        match_type = values[match_option]
         if match_type == 'RESERVED':
-            body = ('{"space":"' + ipspacePath + '","address":"' + address + '","comment":"' + comment + '",' + jsonTags + '}')  # Create body for network creation
-            print(body)
-            jsonBody = json.loads(json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-            response = b1ddi.create('/ipam/address', body=jsonBody)  # Create network using BloxOne API
-            if response.status_code in b1ddi.return_codes_ok:
-                print(response.text)
-            else:
-                print(response.status_code)
-                print(response.text)
+            return '/ipam/address', {'space': space, 'address': values[address], 'comment': values[comment], 'tags': tags}
         elif match_type == 'MAC_ADDRESS':
-            body = ('{"ip_space":"' + ipspacePath + '","address":"' + address + '","match_type":"mac","match_value":"' + match_value +'","comment":"' + comment + '",' + jsonTags + '}')  # Create body for network creation
-            print(body)
-            jsonBody = json.loads(json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-            response = b1ddi.create('/dhcp/fixed_address', body=jsonBody)  # Create network using BloxOne API
-            if response.status_code in b1ddi.return_codes_ok:
-                print(response.text)
+            return '/dhcp/fixed_address', {'ip_space': space, 'address': values[address], 'match_type': 'mac', 'match_value': values[mac_address], 'comment': values[comment], 'tags': tags}
+        return None # Other match types are not supported and skipped
+    return build
+
+def buildzone(columns, migrator):
+    fqdn, view, ns_group, comment = columns['fqdn*'], columns['view'], columns['ns_group'], columns['comment']
+    tags, resolver = migrator.tags, migrator.resolver
+
+    def build(values):
+        body = {'view': resolver.lookup('view', values[view]), 'fqdn': values[fqdn], 'nsgs': [resolver.lookup('nsg', values[ns_group])], 'comment': values[comment], 'primary_type': 'cloud', 'tags': tags}
+        return '/dns/auth_zone', body
+    return build
+
+# Definition for the compile function of a DNS record type, rdata is a list of (rdata field, column, conversion)
+def recordbuilder(rrtype, name, rdata):
+    def buildrecord(columns, migrator):
+        fqdn, view, comment = columns[name], columns['view'], columns['comment']
+        fields = [(field, columns[column], convert) for field, column, convert in rdata]
+        tags, resolver = migrator.tags, migrator.resolver
+
+        def build(values):
+            body = {'view': resolver.lookup('view', values[view]), 'absolute_name_spec': values[fqdn], 'rdata': {field: convert(values[index]) for field, index, convert in fields}, 'comment': values[comment], 'type': rrtype, 'tags': tags}
+            return '/dns/record', body
+        return build
+    return buildrecord
+
+buildarecord = recordbuilder('A', 'fqdn*', [('address', 'address*', str)])
+buildaaaarecord = recordbuilder('AAAA', 'fqdn*', [('address', 'address*', str)])
+buildtxtrecord = recordbuilder('TXT', 'fqdn*', [('text', 'text*', str)])
+buildsrvrecord = recordbuilder('SRV', 'fqdn*', [('port', 'port*', int), ('priority', 'priority*', int), ('target', 'target*', str), ('weight', 'weight*', int)])
+buildmxrecord = recordbuilder('MX', 'fqdn*', [('exchange', 'mx*', str), ('preference', 'priority*', int)])
+buildcnamerecord = recordbuilder('CNAME', 'fqdn*', [('cname', 'canonical_name', str)])
+buildptrrecord = recordbuilder('PTR', 'fqdn', [('dname', 'dname*', str)])
+
+# Object types with the CLI option holding their CSV file, the function compiling the create call and the
+# object type they depend on. Parents are listed before their children.
+objecttypes = {
+    'networkcontainer': ('networkcontainers', buildcontainer, None),
+    'network': ('networks', buildnetwork, 'networkcontainer'),
+    'dhcprange': ('ranges', buildrange, 'network'),
+    'fixedaddress': ('fixed', buildfixed, 'network'),
+    'authzone': ('authzones', buildzone, None),
+    'arecord': ('arecord', buildarecord, 'authzone'),
+    'txtrecord': ('txtrecord', buildtxtrecord, 'authzone'),
+    'mxrecord': ('mxrecord', buildmxrecord, 'authzone'),
+    'ptrrecord': ('ptrrecord', buildptrrecord, 'authzone'),
+    'srvrecord': ('srvrecord', buildsrvrecord, 'authzone'),
+    'aaaarecord': ('aaaarecord', buildaaaarecord, 'authzone'),
+    'cnamerecord': ('cnamerecord', buildcnamerecord, 'authzone'),
+}
+
+# Definition for the address block, subnet or zone a row creates, used as key for the rows depending on it
+def networkkey(item):
+    try:
+        return ipaddress.ip_network(item['address*'] + '/' + item['netmask*'], strict=False)
+    except ValueError:
+        return None
+
+def zonekey(item):
+    return item['view'], item['fqdn*'].lower().rstrip('.')
+
+# Definition for the rows of this run that create address blocks, subnets and zones. Rows depending on one of
+# them wait for that single row, not for the whole CSV file it is in. Rows whose parent is not part of this
+# run don't wait at all, their parent is expected to exist already.
+class Dependencies:
+    keys = {'networkcontainer': networkkey, 'network': networkkey, 'authzone': zonekey}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}
+        self.networks = {}
+        self.lengths = {}
+        self.prefixlens = {}
+        self.zones = set()
+        self.released = set() # Types that stopped, the parents expected after it do not hold back their children
+
+    def keyof(self, objtype, item):
+        if objtype in self.keys:
+            return self.keys[objtype](item)
+        return None
+
+    def expect(self, objtype, key):
+        with self.lock:
+            event = self.events.setdefault((objtype, key), threading.Event())
+            if objtype in self.released:
+                event.set()
+            if objtype == 'authzone':
+                self.zones.add(key)
             else:
-                print(response.status_code)
-                print(response.text)
-
-def addzones(authzones):
-    for item in authzones:
-        nsgroup = b1ddi.get_id('/dns/auth_nsg',key="name",value=item['ns_group'],include_path=True)
-        fqdn = item['fqdn*']
-        comment = item['comment']
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        body = ('{"view":"' + view + '","fqdn":"' + fqdn + '","nsgs":["' + nsgroup + '"],"comment":"' + comment + '","primary_type":"cloud",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/auth_zone', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
-        else:
-            print(response.status_code)
-            print(response.text)
-
-def addarecord(arecord):
-    for item in arecord:
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        fqdn = item['fqdn*']
-        address = item['address*']
-        comment = item['comment']
-        body = ('{"view":"' + view + '","absolute_name_spec":"' + fqdn + '","rdata":{"address":"' + address + '"},"comment":"' + comment + '","type":"A",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(
-            json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/record', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
-        else:
-            print(response.status_code)
-            print(response.text)
-
-def addaaaarecord(aaaarecord):
-    for item in aaaarecord:
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        fqdn = item['fqdn*']
-        address = item['address*']
-        comment = item['comment']
-        body = ('{"view":"' + view + '","absolute_name_spec":"' + fqdn + '","rdata":{"address":"' + address + '"},"comment":"' + comment + '","type":"AAAA",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(
-            json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/record', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
-        else:
-            print(response.status_code)
-            print(response.text)
-
-def addtxtrecord(txtrecord):
-    for item in txtrecord:
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        fqdn = item['fqdn*']
-        text = item['text*']
-        comment = item['comment']
-        body = ('{"view":"' + view + '","absolute_name_spec":"' + fqdn + '","rdata":{"text":"' + text + '"},"comment":"' + comment + '","type":"TXT",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(
-            json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/record', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
-        else:
-            print(response.status_code)
-            print(response.text)
-
-def addsrvrecord(srvrecord):
-    for item in srvrecord:
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        fqdn = item['fqdn*']
-        port = item['port*']
-        priority = item['priority*']
-        target = item['target*']
-        weight = item['weight*']
-        comment = item['comment']
-        body = ('{"view":"' + view + '","absolute_name_spec":"' + fqdn + '","rdata":{"port":' + port + ',"priority":' + priority + ',"target":"' + target + '","weight":' + weight +'},"comment":"' + comment + '","type":"SRV",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(
-            json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/record', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
+                self.networks.setdefault(objtype, set()).add(key)
+                lengths = self.lengths.setdefault(objtype, set())
+                if (key.version, key.prefixlen) not in lengths: # Parents can be registered during the import
+                    lengths.add((key.version, key.prefixlen))
+                    self.prefixlens.pop(objtype, None)
+
+    def done(self, objtype, key):
+        event = self.events.get((objtype, key))
+        if event is not None:
+            event.set()
+
+    def release(self, objtype):
+        with self.lock:
+            self.released.add(objtype)
+            for (eventtype, key), event in self.events.items():
+                if eventtype == objtype:
+                    event.set()
+
+    def wait(self, parent):
+        if parent is not None:
+            self.events[parent].wait()
+
+    # Find the smallest address block or subnet of this run containing a network or address
+    def parentnetwork(self, objtype, network):
+        networks = self.networks.get(objtype)
+        if not networks or network is None:
+            return None
+        with self.lock:
+            prefixlens = self.prefixlens.get(objtype)
+            if prefixlens is None:
+                prefixlens = sorted(self.lengths[objtype], reverse=True)
+                self.prefixlens[objtype] = prefixlens
+        for version, prefixlen in prefixlens:
+            if version == network.version and prefixlen <= network.prefixlen:
+                if network.supernet(new_prefix=prefixlen) in networks:
+                    return objtype, network.supernet(new_prefix=prefixlen)
+        return None
+
+    # Find the closest enclosing zone of this run for a record name
+    def parentzone(self, view, fqdn):
+        labels = fqdn.lower().rstrip('.').split('.')
+        for i in range(len(labels)):
+            key = (view, '.'.join(labels[i:]))
+            if key in self.zones:
+                return 'authzone', key
+        return None
+
+    def parentof(self, objtype, item):
+        try:
+            if objtype == 'network':
+                return self.parentnetwork('networkcontainer', networkkey(item))
+            elif objtype == 'dhcprange':
+                return self.parentnetwork('network', ipaddress.ip_network(item['start_address*']))
+            elif objtype == 'fixedaddress':
+                return self.parentnetwork('network', ipaddress.ip_network(item['ip_address*']))
+            elif objecttypes[objtype][2] == 'authzone':
+                return self.parentzone(item['view'], item.get('fqdn*') or item.get('fqdn') or '')
+        except ValueError:
+            pass # Invalid addresses are left to the API to reject
+        return None
+
+# Definition for the offline validation of the IPAM CSV files, run before any API call. Address blocks and
+# subnets are sorted by (start address, prefix length) and swept with a stack of open prefixes, which builds
+# their containment tree in O(n log n): a prefix that equals the top of the stack is a duplicate and a prefix
+# inside a subnet overlaps it. Ranges and fixed addresses are then looked up in the sorted, non-overlapping
+# subnets with a binary search. Rows that fail a check are rejected, written to the reject file and skipped.
+# The checks keep the addresses and row numbers of the rows, not the rows themselves.
+class Validator:
+    def __init__(self, source):
+        self.source = source
+        self.rejected = {}
+        self.networks = {4: ([], []), 6: ([], [])}
+        self.hasnetworks = False
+
+    # Without the row its values are read again by readrejects after the checks
+    def reject(self, objtype, rownum, reason, item=None):
+        self.rejected.setdefault(objtype, {})[rownum] = (reason, item.values if item is not None else None)
+
+    # Ranges and fixed addresses are checked in one pass after the subnets are known, with an export that makes
+    # two reads of the file before the import and a third one when rows are rejected as duplicates or overlaps
+    def run(self):
+        prefixes, addresses = self.source.groups(('networkcontainer', 'network'), ('dhcprange', 'fixedaddress'))
+        self.checkprefixes(prefixes)
+        ranges = {}
+        seen = {}
+        for objtype, rownum, item in addresses:
+            if objtype == 'dhcprange':
+                self.checkrange(rownum, item, ranges)
+            else:
+                self.checkfixed(rownum, item, seen)
+        self.checkoverlaps(ranges)
+        self.readrejects()
+        return sum(len(rows) for rows in self.rejected.values())
+
+    # Definition for the values of the rows rejected after they were read, with one more read of their object types
+    def readrejects(self):
+        objtypes = [objtype for objtype, rows in self.rejected.items() if any(values is None for reason, values in rows.values())]
+        if not objtypes:
+            return
+        for objtype, rownum, item in self.source.rows(objtypes):
+            rows = self.rejected[objtype]
+            if rownum in rows and rows[rownum][1] is None:
+                rows[rownum] = (rows[rownum][0], item.values)
+
+    def checkprefixes(self, rows):
+        prefixes = []
+        for objtype, rownum, item in rows:
+            if objtype == 'network':
+                self.hasnetworks = True
+            try:
+                address = ipaddress.ip_address(item['address*'])
+                network = ipaddress.ip_network(str(address) + '/' + str(getPrefixlen(item['netmask*'])))
+            except ValueError as e:
+                self.reject(objtype, rownum, 'Invalid address or netmask: ' + str(e), item)
+                continue
+            prefixes.append((network.version, int(network.network_address), network.prefixlen, int(network.broadcast_address), objtype, rownum))
+        prefixes.sort(key=lambda prefix: prefix[:3])
+        stack = []
+        for prefix in prefixes:
+            version, start, prefixlen, end, objtype, rownum = prefix
+            while stack and (stack[-1][0] != version or stack[-1][3] < start):
+                stack.pop()
+            if stack and stack[-1][1:3] == (start, prefixlen):
+                self.reject(objtype, rownum, 'Duplicate of ' + stack[-1][4] + ' row ' + str(stack[-1][5]))
+            elif stack and stack[-1][4] == 'network':
+                self.reject(objtype, rownum, 'Overlaps network row ' + str(stack[-1][5]))
+            else:
+                stack.append(prefix)
+                if objtype == 'network':
+                    starts, networks = self.networks[version]
+                    starts.append(start)
+                    networks.append((end, rownum))
+
+    # Definition for the subnet of this run containing an address, as (end address, row number)
+    def findnetwork(self, address):
+        starts, networks = self.networks[address.version]
+        index = bisect.bisect_right(starts, int(address)) - 1
+        if index >= 0 and int(address) <= networks[index][0]:
+            return starts[index], networks[index][0], networks[index][1]
+        return None
+
+    # Definition for checking one range, the ranges inside a subnet are collected in ranges per subnet row
+    def checkrange(self, rownum, item, ranges):
+        try:
+            start = ipaddress.ip_address(item['start_address*'])
+            end = ipaddress.ip_address(item['end_address*'])
+        except ValueError as e:
+            self.reject('dhcprange', rownum, 'Invalid address: ' + str(e), item)
+            return
+        if start.version != end.version or start > end:
+            self.reject('dhcprange', rownum, 'Start address ' + str(start) + ' is after end address ' + str(end), item)
+            return
+        if not self.hasnetworks:
+            return # Without networks in this run the subnets are expected to exist in B1DDI already
+        network = self.findnetwork(start)
+        if network is None:
+            self.reject('dhcprange', rownum, 'Range is outside every network', item)
+        elif int(end) > network[1]:
+            self.reject('dhcprange', rownum, 'Range is not inside network row ' + str(network[2]), item)
         else:
-            print(response.status_code)
-            print(response.text)
-
-def addmxrecord(mxrecord):
-    for item in mxrecord:
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        fqdn = item['fqdn*']
-        exchange = item['mx*']
-        preference = item['priority*']
-        comment = item['comment']
-        body = ('{"view":"' + view + '","absolute_name_spec":"' + fqdn + '","rdata":{"exchange":"' + exchange + '","preference":' + preference + '},"comment":"' + comment + '","type":"MX",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(
-            json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/record', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
+            ranges.setdefault(network[2], []).append((int(start), int(end), rownum))
+
+    # Definition for rejecting the ranges overlapping an earlier range of the same subnet
+    def checkoverlaps(self, ranges):
+        for networkranges in ranges.values():
+            networkranges.sort()
+            last = None
+            for start, end, rownum in networkranges:
+                if last is not None and start <= last[1]:
+                    self.reject('dhcprange', rownum, 'Overlaps range row ' + str(last[2]))
+                else:
+                    last = (start, end, rownum)
+
+    # Definition for checking one fixed address, seen holds the row number of every address checked
+    # before by (IP version, address as integer)
+    def checkfixed(self, rownum, item, seen):
+        try:
+            address = ipaddress.ip_address(item['ip_address*'])
+        except ValueError as e:
+            self.reject('fixedaddress', rownum, 'Invalid address: ' + str(e), item)
+            return
+        key = (address.version, int(address))
+        if key in seen:
+            self.reject('fixedaddress', rownum, 'Duplicate of fixedaddress row ' + str(seen[key]), item)
+            return
+        seen[key] = rownum
+        if not self.hasnetworks:
+            return
+        network = self.findnetwork(address)
+        if network is None:
+            self.reject('fixedaddress', rownum, 'Address is outside every network', item)
+        elif address.version == 4 and network[1] - network[0] > 1 and int(address) in (network[0], network[1]):
+            self.reject('fixedaddress', rownum, 'Address is the network or broadcast address of network row ' + str(network[2]), item)
+
+    def writerejects(self, filename):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['object_type', 'row', 'reason', 'values'])
+            for objtype, rows in self.rejected.items():
+                for rownum in sorted(rows):
+                    reason, values = rows[rownum]
+                    writer.writerow([objtype, rownum, reason] + list(values))
+
+    def report(self):
+        for objtype in objecttypes:
+            if objtype in self.rejected:
+                print('Validation rejected ' + str(len(self.rejected[objtype])) + ' ' + objtype + ' rows')
+
+# Definition for running an import as a DAG of object types: address blocks -> subnets -> ranges/fixed
+# addresses and auth zones -> records. Every object type gets its own thread and all of them start at once,
+# so independent branches run at the same time and dependent rows start as soon as their own parent exists.
+class Scheduler:
+    def __init__(self, migrator, rejected):
+        self.migrator = migrator
+        self.source = migrator.source
+        self.rejected = rejected
+        self.shard = migrator.shard
+        self.stopped = {}
+        self.deps = Dependencies()
+        complete = self.source.expect(self.deps) # Only the keys of parent rows are kept, not the rows themselves
+        self.parents = self.deps
+        if self.shard is not None and not complete:
+            self.parents = Dependencies() # Shard by all parents, not by the ones the reader happened to register
+            self.source.expect(self.parents, complete=True)
+
+    # Definition for the shard of a row with --shard K/N. Address blocks and zones are shard 0, which is imported
+    # before the others. Subnets are spread over shards 1 to N by a hash of their prefix, ranges and fixed addresses
+    # go with the subnet of this run containing them and records are spread by a hash of their name, so every row
+    # either waits for its parent in its own shard or finds it created by shard 0. Every shard reads all rows and
+    # registers all parents before sharding, so the same row lands in the same shard on every host.
+    def shardof(self, objtype, item):
+        parent = objecttypes[objtype][2]
+        if parent is None:
+            return 0
+        if objtype == 'network':
+            key = networkkey(item)
+        elif parent == 'network':
+            network = self.parents.parentof(objtype, item)
+            key = network[1] if network is not None else item.get('start_address*') or item.get('ip_address*')
         else:
-            print(response.status_code)
-            print(response.text)
-
-def addcnamerecord(cnamerecord):
-    for item in cnamerecord:
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        fqdn = item['fqdn*']
-        cname = item['canonical_name']
-        comment = item['comment']
-        body = ('{"view":"' + view + '","absolute_name_spec":"' + fqdn + '","rdata":{"cname":"' + cname + '"},"comment":"' + comment + '","type":"CNAME",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(
-            json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/record', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
+            key = (item.get('fqdn*') or item.get('fqdn') or '').lower().rstrip('.')
+        return 1 + zlib.crc32(str(key).encode()) % self.shard[1]
+
+    def inshard(self, objtype, item):
+        return self.shardof(objtype, item) == self.shard[0]
+
+    # Longest chain of dependent object types, weighted by their number of rows
+    def criticalpath(self, counts):
+        paths = {}
+        for objtype, (option, build, parent) in objecttypes.items():
+            if objtype in counts:
+                rows, path = paths.get(parent, (0, []))
+                paths[objtype] = (rows + counts[objtype], path + [objtype])
+        return max(paths.values(), default=(0, []))
+
+    def plan(self):
+        workers = self.migrator.options.workers
+        shard = '' if self.shard is None else 'shard ' + str(self.shard[0]) + '/' + str(self.shard[1]) + ', '
+        print('Import plan (' + shard + str(workers) + ' workers per object type):')
+        counts = {}
+        waiting = {}
+        for objtype, rownum, item in self.source.rows(self.source.types(), self.deps):
+            if self.shard is not None and not self.inshard(objtype, item):
+                continue
+            counts[objtype] = counts.get(objtype, 0) + 1
+            if objecttypes[objtype][2] is not None and self.deps.parentof(objtype, item) is not None:
+                waiting[objtype] = waiting.get(objtype, 0) + 1
+        for objtype, (option, build, parent) in objecttypes.items():
+            if objtype not in counts:
+                continue
+            line = '  ' + objtype + ': ' + str(counts[objtype]) + ' rows'
+            if parent is not None:
+                line += ', ' + str(waiting.get(objtype, 0)) + ' wait for their ' + parent + ' in this run'
+            print(line)
+        rows, path = self.criticalpath(counts)
+        rounds = -(-rows // workers)
+        print('Critical path: ' + ' -> '.join(path) + ' (' + str(rows) + ' rows, at most ' + str(rounds) + ' request rounds)')
+
+    def run(self):
+        threads = []
+        streams = self.source.streams(self.deps)
+        for objtype in self.source.types():
+            thread = threading.Thread(target=self.runtype, args=(objtype, streams[objtype]), name=objtype, daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+    def runtype(self, objtype, rows):
+        try:
+            self.migrator.createobjects(objtype, rows, objecttypes[objtype][1], deps=self.deps, rejected=self.rejected.get(objtype, {}),
+                                        shard=self.inshard if self.shard is not None else None)
+        except Exception as e:
+            self.stopped[objtype] = repr(e) # Reported in the summary and the exit code, the other object types go on
+            printline('Stopped importing ' + objtype + ': ' + repr(e))
+        finally:
+            rows.close() # Stop reading rows for this object type, also after an error
+            self.deps.release(objtype) # Never leave dependent rows waiting, also not after an error
+
+# Definition for the CSV files supplied on the command line, per object type
+def selectcsv(options):
+    csvfiles = {}
+    for objtype, (option, build, parent) in objecttypes.items():
+        csvfile = getattr(options, option)
+        if csvfile is not None:
+            csvfiles[objtype] = csvfile
+    return csvfiles
+
+# Definition for --shard K/N, returns (K, N)
+def parseshard(value):
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value)
+    if match is None or not 0 <= int(match.group(1)) <= int(match.group(2)) or int(match.group(2)) < 1:
+        raise ValueError('--shard needs to be K/N with K from 0 to N, for example 2/8')
+    return int(match.group(1)), int(match.group(2))
+
+# Definition for the file of one shard, for example csv2b1ddi.results.jsonl becomes csv2b1ddi.results.shard2.jsonl
+def shardfile(filename, shard):
+    base, ext = os.path.splitext(filename)
+    return base + '.shard' + str(shard) + ext
+
+# Definition for one migration into B1DDI, for running it from the command line or embedding it in another
+# program. The settings are the command line options by their dest name, for example:
+#
+#     migrator = Migrator('b1.ini', 'default', networks='networks.csv', arecord='arecords.csv', workers=16)
+#     rejected = migrator.validate()
+#     results = migrator.run(rejected)
+#
+# Creating a migrator makes no API calls. The connection is set up by run() and every reference collection,
+# the IP space included, is only fetched when the first row that needs it is imported.
+class Migrator:
+    def __init__(self, config, ipspace, **settings):
+        options = parser.parse_args([]) # The defaults, values like an ipspace starting with - are not parsed as options
+        options.config = config
+        options.ipspace = ipspace
+        for name, value in settings.items():
+            if not hasattr(options, name):
+                raise TypeError('Unknown setting ' + name)
+            setattr(options, name, value)
+        if options.workers < 1:
+            raise ValueError('--workers needs to be 1 or more')
+        if options.rate < 0 or options.retries < 0:
+            raise ValueError('--rate and --retries can not be negative')
+        if options.progress <= 0:
+            raise ValueError('--progress needs to be more than 0 seconds')
+        if options.processes < 0:
+            raise ValueError('--processes can not be negative')
+        self.shard = None
+        if options.shard is not None:
+            self.shard = parseshard(options.shard)
+            for name in ('journal', 'rejects', 'results', 'metrics'): # Every shard has its own session and files
+                if getattr(options, name) is not None:
+                    setattr(options, name, shardfile(getattr(options, name), self.shard[0]))
+        try:
+            self.tags = parsetags(options.tags)
+        except ValueError:
+            raise ValueError('--tags needs to be a JSON object, for example {"OWNER":"jneerdael"}')
+        csvfiles = selectcsv(options)
+        if options.export is not None:
+            if csvfiles:
+                raise ValueError('--export can not be combined with CSV files per object type')
+            self.source = Export(options.export)
         else:
-            print(response.status_code)
-            print(response.text)
-
-def addptrrecord(ptrrecord):
-    for item in ptrrecord:
-        view = b1ddi.get_id('/dns/view', key="name",value=item['view'], include_path=True)
-        fqdn = item['fqdn']
-        dname = item['dname*']
-        comment = item['comment']
-        body = ('{"view":"' + view + '","absolute_name_spec":"' + fqdn + '","rdata":{"dname":"' + dname + '"},"comment":"' + comment + '","type":"PTR",' + jsonTags + '}')  # Create body for network creation
-        jsonBody = json.loads(
-            json.dumps(body))  # Convert body to correct JSON and ensure quotes " are not escaped (ex. \")
-        response = b1ddi.create('/dns/record', body=jsonBody)  # Create network using BloxOne API
-        if response.status_code in b1ddi.return_codes_ok:
-            print(response.text)
+            self.source = CSVFiles(csvfiles)
+        self.options = options
+        self.b1ddi = None
+        self.resolver = None
+        self.sync = None
+        self.journal = None
+        self.results = None
+        self.space = None
+        self.lock = threading.Lock()
+
+    # Definition for the connection to B1DDI, the ini file with the URL, version and API key is read here
+    def connect(self):
+        if self.b1ddi is None:
+            options = self.options
+            self.b1ddi = Transport(options.config, connections=options.workers * len(self.source.types()) + 4, rate=options.rate, retries=options.retries, compress=options.gzip)
+            self.resolver = Resolver(self.b1ddi)
+        return self.b1ddi
+
+    # Definition for the IP space that we will import data in (Network View), looked up by the first IPAM row
+    def ipspace(self):
+        with self.lock:
+            if self.space is None:
+                space = self.resolver.lookup('ipspace', self.options.ipspace, None)
+                if space is None:
+                    raise ValueError('IP space ' + self.options.ipspace + ' does not exist in B1DDI')
+                printline('The IP space used is ' + self.options.ipspace + ' with the following path: ' + space)
+                self.space = space
+            return self.space
+
+    # Definition for validating the CSV files offline, returns the rejected rows per object type
+    def validate(self):
+        validator = Validator(self.source)
+        if validator.run():
+            validator.writerejects(self.options.rejects)
+            validator.report()
+            print('Rejected rows are written to ' + self.options.rejects)
         else:
-            print(response.status_code)
-            print(response.text)
-
-def checkcsv():
-    if options.networkcontainers is not None:
-        networkcontainers = csv_dict_list(options.networkcontainers)
-        addcontainers(networkcontainers)
-    if options.networks is not None:
-        networks = csv_dict_list(options.networks)
-        addnetworks(networks)
-    if options.ranges is not None:
-        ranges = csv_dict_list(options.ranges)
-        addranges(ranges)
-    if options.fixed is not None:
-        fixed = csv_dict_list(options.fixed)
-        addfixed(fixed)
-    if options.authzones is not None:
-        authzones = csv_dict_list(options.authzones)
-        addzones(authzones)
-    if options.arecord is not None:
-        arecord = csv_dict_list(options.arecord)
-        addarecord(arecord)
-    if options.txtrecord is not None:
-        txtrecord = csv_dict_list(options.txtrecord)
-        addtxtrecord(txtrecord)
-    if options.mxrecord is not None:
-        mxrecord = csv_dict_list(options.mxrecord)
-        addmxrecord(mxrecord)
-    if options.ptrrecord is not None:
-        ptrrecord = csv_dict_list(options.ptrrecord)
-        addptrrecord(ptrrecord)
-    if options.srvrecord is not None:
-        srvrecord = csv_dict_list(options.srvrecord)
-        addsrvrecord(srvrecord)
-    if options.aaaarecord is not None:
-        aaaarecord = csv_dict_list(options.aaaarecord)
-        addaaaarecord(aaaarecord)
-    if options.cnamerecord is not None:
-        cnamerecord = csv_dict_list(options.cnamerecord)
-        addcnamerecord(cnamerecord)
-    print('Finished processing all CSV files')
-
-checkcsv()
+            print('Validation found no invalid rows')
+        return validator.rejected
+
+    def plan(self):
+        Scheduler(self, {}).plan()
+        self.source.report()
+
+    # Definition for comparing the objects in B1DDI with the CSV files, returns the number of differences
+    def verify(self):
+        options = self.options
+        self.connect()
+        verifier = Verifier(self)
+        verifier.loadrows()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=options.workers) as executor:
+            verifier.loadobjects(executor, options.workers)
+        differences = verifier.compare(options.verify)
+        verifier.report()
+        print(str(differences) + ' differences are written to ' + options.verify)
+        self.source.report()
+        self.resolver.report()
+        self.b1ddi.report()
+        return differences
+
+    # Definition for importing the CSV files, rows in rejected are skipped. Returns the results of the run, its
+    # failures() are the failed rows plus the object types that stopped on an error.
+    def run(self, rejected=None):
+        options = self.options
+        scheduler = Scheduler(self, rejected or {})
+        self.connect()
+        if options.sync:
+            self.sync = Sync(self.b1ddi)
+        self.journal = Journal(options.journal, resume=options.resume)
+        if options.resume:
+            print('Resuming, ' + str(len(self.journal.committed)) + ' rows in ' + options.journal + ' are already created')
+        self.results = Results(options.results, append=options.resume, metrics=options.metrics, transport=self.b1ddi,
+                               shard=self.shard[0] if self.shard is not None else None)
+        self.results.run(self.source, options.progress)
+        try:
+            scheduler.run()
+        finally:
+            self.journal.close() # Also write the last batch when the run is interrupted
+            self.results.aborted.update(scheduler.stopped)
+            self.results.close()
+        print('Finished processing all CSV files, the result of every row is written to ' + options.results)
+        self.source.report()
+        self.results.report()
+        self.resolver.report()
+        self.b1ddi.report()
+        return self.results
+
+    # Definition for creating the objects of one object type, keeping up to options.workers creates in flight.
+    # The create calls are built by the function the compiler returns for the CSV header. With dependencies every row
+    # first waits until the row creating its parent object is finished. Rows for which shard returns False are
+    # left to another shard, they only release the rows waiting for them.
+    def createobjects(self, objtype, rows, compiler, deps=None, rejected=(), shard=None):
+        slots = threading.BoundedSemaphore(self.options.workers)
+        log = ResultLog(objtype, slots, self.results, ordered=self.options.ordered)
+        columns = None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.options.workers) as executor:
+            for rownum, item in enumerate(rows, start=1):
+                if item.columns is not columns:
+                    columns = item.columns
+                    build = compiler(columns, self)
+                    width = len(columns)
+                if shard is not None and not shard(objtype, item):
+                    self.finishobject(objtype, rownum, deps.keyof(objtype, item), False, log, deps)
+                    continue
+                key = None
+                if deps is not None:
+                    deps.wait(deps.parentof(objtype, item))
+                    key = deps.keyof(objtype, item)
+                rowhash = None
+                values = item.values
+                if len(values) < width:
+                    values += ('',) * (width - len(values)) # Short rows are padded with empty values
+                slots.acquire() # Wait for a free slot so only options.workers rows are in flight
+                if rownum in rejected:
+                    self.finishobject(objtype, rownum, key, (None, rejected[rownum][0], 'rejected', None), log, deps)
+                    continue
+                try:
+                    job = build(values)
+                except ValueError as e:
+                    self.finishobject(objtype, rownum, key, (0, 'Invalid row: ' + str(e), 'created', None), log, deps)
+                    continue
+                if job is not None:
+                    path, body = job
+                    id = None
+                    if self.sync is not None:
+                        path, body, id = self.sync.diff(path, body)
+                    if body is None:
+                        job = None # Already exists in B1DDI and unchanged
+                    else:
+                        job = path, serialize(body), id
+                if job is not None and self.journal is not None:
+                    path, body, id = job
+                    rowhash = self.journal.hash(path if id is None else path + '/' + id, body) # Updates of different objects can have the same body
+                    if rowhash in self.journal.committed:
+                        job = None # Created by an earlier run
+                if job is None:
+                    slots.release()
+                    self.finishobject(objtype, rownum, key, None, log, deps)
+                    continue
+                future = executor.submit(self.createobject, *job)
+                future.add_done_callback(lambda future, rownum=rownum, key=key, job=job, rowhash=rowhash: self.finishobject(objtype, rownum, key, future.result(), log, deps, job, rowhash))
+        if objtype in self.results.counts: # Object types without rows in an export are left out
+            printline('Finished ' + self.results.finished(objtype))
+
+    # Definition for handling a finished create: release the rows waiting for it, journal and log the result
+    def finishobject(self, objtype, rownum, key, result, log, deps, job=None, rowhash=None):
+        if key is not None:
+            deps.done(objtype, key)
+        if self.journal is not None and job is not None:
+            self.journal.record(rowhash, objtype, job[0], rownum, result[0], result[1])
+        log.done(rownum, result)
+
+    # Definition for sending one create or update call and returning its status code, response text, action and latency
+    def createobject(self, path, body, id=None):
+        action = 'created'
+        start = time.perf_counter()
+        try:
+            if id is None:
+                response = self.b1ddi.create(path, body=body)
+            else:
+                action = 'updated'
+                response = self.b1ddi.replace(path, id=id.rsplit('/', 1)[1], body=body) # PATCH only the changed fields
+        except Exception as e:
+            return 0, str(e), action, time.perf_counter() - start # Connection errors are reported for the row instead of stopping the import
+        return response.status_code, response.text, action, time.perf_counter() - start
+
+# Definition for the combined report of the results files of several shards, written on this machine or copied
+# from other hosts. The files are read one line at a time and every line is counted, so a row that failed and
+# was created by a run with --resume counts once for every attempt. Returns the merged results.
+def merge(filenames, metrics=None):
+    results = Results(None, metrics=metrics)
+    merged = 0
+    for filename in filenames:
+        try:
+            results.load(filename)
+            merged += 1
+        except FileNotFoundError:
+            print('No results file ' + filename + ', the shard writing it did not start')
+    print('Merged ' + str(merged) + ' results files')
+    results.report()
+    if metrics:
+        results.writemetrics()
+    return results
+
+# Definition for the last progress line in the log file of a shard
+def lastprogress(logfile):
+    with open(logfile, 'rb') as f:
+        f.seek(max(0, os.path.getsize(logfile) - 4096))
+        lines = [line for line in f.read().decode(errors='replace').splitlines() if line.startswith('Progress:')]
+    return lines[-1] if lines else None
+
+# Definition for waiting until the processes of the given shards exit, repeating their progress lines
+def waitshards(shards, count, interval):
+    codes = {}
+    last = time.monotonic()
+    while True:
+        for shard, process, logfile in shards:
+            if shard not in codes and process.poll() is not None:
+                codes[shard] = process.returncode
+                print('Shard ' + str(shard) + '/' + str(count) + ' finished with exit code ' + str(process.returncode))
+        if len(codes) == len(shards):
+            return codes
+        if time.monotonic() - last >= interval:
+            last = time.monotonic()
+            for shard, process, logfile in shards:
+                line = lastprogress(logfile) if shard not in codes else None
+                if line is not None:
+                    print('Shard ' + str(shard) + '/' + str(count) + ' ' + line)
+        time.sleep(0.2)
+
+# Definition for running an import in processes on this machine with the same arguments and --shard K/N: shard 0
+# with the address blocks and zones first, then shards 1 to N at the same time. Every shard writes its output to
+# its own log file next to its results file. Returns the highest exit code of the shards.
+def launch(options, argv):
+    count = options.processes
+    command = [sys.executable, os.path.abspath(__file__)] + list(argv)
+    def start(shard):
+        logfile = shardfile(os.path.splitext(options.results)[0] + '.log', shard)
+        with open(logfile, 'w') as log:
+            process = subprocess.Popen(command + ['--shard', str(shard) + '/' + str(count)], stdout=log, stderr=subprocess.STDOUT)
+        print('Started shard ' + str(shard) + '/' + str(count) + ' (pid ' + str(process.pid) + '), output in ' + logfile)
+        return shard, process, logfile
+    codes = waitshards([start(0)], count, options.progress)
+    if codes[0]:
+        print('Shard 0 failed, the other shards are not started')
+        return codes[0]
+    codes.update(waitshards([start(shard) for shard in range(1, count + 1)], count, options.progress))
+    merge([shardfile(options.results, shard) for shard in range(count + 1)], options.metrics)
+    return max(codes.values())
+
+# Definition for the command line, returns the exit code
+def main(argv=None):
+    options = parser.parse_args(argv)
+    if options.merge:
+        return 1 if merge(options.merge, options.metrics).failures() else 0
+    if options.ipspace is None or options.config is None:
+        parser.error('the following arguments are required: -i/--ipspace, -c/--config')
+    settings = dict(vars(options)) # A copy, options is used again below
+    try:
+        migrator = Migrator(settings.pop('config'), settings.pop('ipspace'), **settings)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if options.verify:
+        return 1 if migrator.verify() else 0
+
+    # Every shard validates and imports in its own process
+    if options.processes and options.shard is None and not options.validateonly and not options.plan:
+        return launch(options, sys.argv[1:] if argv is None else argv)
+
+    # Validate the IPAM CSV files before any API call
+    rejected = {}
+    if options.validateonly or (options.validate and not options.plan):
+        rejected = migrator.validate()
+    if options.validateonly:
+        return 1 if rejected else 0
+    if options.plan:
+        migrator.plan()
+        return 0
+    results = migrator.run(rejected)
+    return 1 if results.failures() else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
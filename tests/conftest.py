@@ -0,0 +1,30 @@
+import csv, os, sys, threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import pytest
+
+import mock_b1ddi
+
+# Definition for writing CSV files in the NIOS format: a header-xxx line followed by the rows
+@pytest.fixture
+def writecsv(tmp_path):
+    def write(name, rows):
+        filename = str(tmp_path / name)
+        with open(filename, 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        return filename
+    return write
+
+# Definition for a mock B1DDI server on a free port, returns the server and the ini file pointing at it
+@pytest.fixture
+def mock(tmp_path):
+    server = mock_b1ddi.MockB1DDI(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ini = str(tmp_path / 'mock.ini')
+    with open(ini, 'w') as f:
+        f.write("[BloxOne]\nurl = 'http://127.0.0.1:" + str(server.server_address[1]) + "'\napi_version = 'v1'\napi_key = '" + 'a' * 32 + "'\n")
+    yield server, ini
+    server.shutdown()
+    server.server_close()
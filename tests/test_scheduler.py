@@ -0,0 +1,18 @@
+import threading
+
+import csv2b1ddi
+
+def test_stopped_parent_releases_children(writecsv, mock, tmp_path):
+    # Networks without dhcp_members stop their object type while the export is still read, the ranges expected
+    # after that do not wait for the networks that will never be created
+    server, ini = mock
+    networks = [['header-network', 'address*', 'netmask*', 'comment']] + [['network', '10.%d.%d.0' % divmod(i, 256), '24', ''] for i in range(3000)]
+    export = writecsv('grid.csv', networks + [['header-dhcprange', 'start_address*', 'end_address*', 'comment'], ['dhcprange', '10.11.183.10', '10.11.183.20', '']])
+    migrator = csv2b1ddi.Migrator(ini, 'default', export=export, validate=False, results=str(tmp_path / 'results.jsonl'),
+                                  journal=str(tmp_path / 'journal'), rejects=str(tmp_path / 'rejects.csv'))
+    results = []
+    thread = threading.Thread(target=lambda: results.append(migrator.run()), daemon=True)
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive(), 'import hangs on the children of a stopped object type'
+    assert 'network' in results[0].aborted
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+import csv2b1ddi, generate_csv
+
+shards = 3
+
+@pytest.fixture
+def dataset(tmp_path):
+    return generate_csv.generate(str(tmp_path), 64, ['networkcontainer', 'network', 'dhcprange', 'fixedaddress', 'authzone', 'arecord', 'ptrrecord'], 2)
+
+# Definition for the shard of every row, as {(object type, row number): shard}
+def assign(settings):
+    assigned = {}
+    for shard in range(shards + 1):
+        migrator = csv2b1ddi.Migrator('b1.ini', 'default', shard=str(shard) + '/' + str(shards), **settings)
+        scheduler = csv2b1ddi.Scheduler(migrator, {})
+        for objtype, rownum, item in migrator.source.rows(migrator.source.types()):
+            if scheduler.inshard(objtype, item):
+                assert (objtype, rownum) not in assigned, 'row in two shards'
+                assigned[(objtype, rownum)] = shard
+    return assigned
+
+def filesettings(dataset):
+    return {option: dataset[objtype] for objtype, (option, build, parent) in csv2b1ddi.objecttypes.items() if objtype in dataset}
+
+def test_every_row_in_one_shard(dataset):
+    assigned = assign(filesettings(dataset))
+    rows = {objtype: sum(1 for line in open(csvfile)) - 1 for objtype, csvfile in dataset.items()}
+    assert len(assigned) == sum(rows.values())
+    for (objtype, rownum), shard in assigned.items():
+        if objtype in ('networkcontainer', 'authzone'):
+            assert shard == 0
+        else:
+            assert 1 <= shard <= shards
+    assert len({shard for (objtype, rownum), shard in assigned.items() if objtype == 'network'}) == shards
+
+def test_children_follow_their_subnet(dataset):
+    assigned = assign(filesettings(dataset))
+    # Every subnet of the dataset holds range and fixed address i of subnet i
+    for (objtype, rownum), shard in assigned.items():
+        if objtype in ('dhcprange', 'fixedaddress'):
+            assert shard == assigned[('network', rownum)]
+
+def test_export_order(dataset, tmp_path):
+    # An export listing the children before their parents shards every row as the CSV files per object type
+    export = str(tmp_path / 'grid.csv')
+    with open(export, 'w') as f:
+        for objtype in ('ptrrecord', 'dhcprange', 'fixedaddress', 'arecord', 'network', 'authzone', 'networkcontainer'):
+            with open(dataset[objtype]) as csvfile:
+                f.write(csvfile.read())
+    assert assign({'export': export}) == assign(filesettings(dataset))
+
+def test_shard_argument():
+    for value in ('4/3', '1', '-1/3', '1/0', 'a/b'):
+        with pytest.raises(ValueError):
+            csv2b1ddi.Migrator('b1.ini', 'default', shard=value)
+    assert csv2b1ddi.parseshard(' 2 / 8 ') == (2, 8)
+    assert csv2b1ddi.shardfile('csv2b1ddi.results.jsonl', 2) == 'csv2b1ddi.results.shard2.jsonl'
+
+def test_migrator_arguments():
+    # The config and ipspace of an embedding program are taken as they are, not parsed as command line options
+    migrator = csv2b1ddi.Migrator('-b1.ini', '-lab', shard='1/2')
+    assert (migrator.options.config, migrator.options.ipspace) == ('-b1.ini', '-lab')
+
+def test_import_shards(dataset, tmp_path, mock):
+    # All shards against the mock server create every object exactly once, and their results merge to one summary
+    server, ini = mock
+    results = str(tmp_path / 'results.jsonl')
+    for shard in range(shards + 1):
+        migrator = csv2b1ddi.Migrator(ini, 'default', shard=str(shard) + '/' + str(shards), workers=4, results=results,
+                                      journal=str(tmp_path / 'journal'), rejects=str(tmp_path / 'rejects.csv'), **filesettings(dataset))
+        assert migrator.run(migrator.validate()).failures() == 0
+    with server.lock:
+        created = {endpoint: len(objects) for endpoint, objects in server.objects.items()}
+    rows = {objtype: sum(1 for line in open(csvfile)) - 1 for objtype, csvfile in dataset.items()}
+    assert created['/ipam/address_block'] == rows['networkcontainer']
+    assert created['/ipam/subnet'] == rows['network']
+    assert created['/ipam/range'] == rows['dhcprange']
+    assert created['/ipam/address'] + created['/dhcp/fixed_address'] == rows['fixedaddress']
+    assert created['/dns/auth_zone'] == rows['authzone']
+    assert created['/dns/record'] == rows['arecord'] + rows['ptrrecord']
+    merged = csv2b1ddi.merge([csv2b1ddi.shardfile(results, shard) for shard in range(shards + 1)])
+    for objtype, count in rows.items():
+        assert merged.counts[objtype]['created'] == count
+    for line in open(csv2b1ddi.shardfile(results, 0)):
+        assert json.loads(line)['type'] in ('networkcontainer', 'authzone')
@@ -0,0 +1,23 @@
+import csv2b1ddi
+
+networkheader = ['header-network', 'address*', 'netmask*', 'comment', 'dhcp_members']
+
+def run(ini, tmp_path, journal, networks, **settings):
+    migrator = csv2b1ddi.Migrator(ini, 'default', networks=networks, journal=str(tmp_path / journal), results=str(tmp_path / 'results.jsonl'),
+                                  rejects=str(tmp_path / 'rejects.csv'), **settings)
+    return migrator.run(migrator.validate())
+
+def test_resume_updates(writecsv, mock, tmp_path):
+    # Updates with the same changed fields for different objects are journaled apart, a resumed run sends the
+    # update of the object the first run did not get to
+    server, ini = mock
+    both = writecsv('both.csv', [networkheader, ['network', '10.0.0.0', '24', 'same', 'dhcp1'], ['network', '10.0.1.0', '24', 'same', 'dhcp1']])
+    first = writecsv('first.csv', [networkheader, ['network', '10.0.0.0', '24', 'same', 'dhcp1']])
+    tags = '{"OWNER":"network team"}'
+    assert run(ini, tmp_path, 'create', both).counts['network']['created'] == 2
+    assert run(ini, tmp_path, 'sync', first, tags=tags, sync=True).counts['network']['updated'] == 1
+    results = run(ini, tmp_path, 'sync', both, tags=tags, sync=True, resume=True)
+    assert results.counts['network'] == {'created': 0, 'updated': 1, 'failed': 0, 'rejected': 0, 'skipped': 1}
+    with server.lock:
+        subnets = list(server.objects['/ipam/subnet'].values())
+    assert [subnet['tags'] for subnet in subnets] == [{'OWNER': 'network team'}] * 2
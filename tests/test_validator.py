@@ -0,0 +1,117 @@
+import json
+
+import csv2b1ddi
+
+networkheader = ['header-network', 'address*', 'netmask*', 'comment']
+containerheader = ['header-networkcontainer', 'address*', 'netmask*', 'comment']
+rangeheader = ['header-dhcprange', 'start_address*', 'end_address*', 'comment']
+fixedheader = ['header-fixedaddress', 'ip_address*', 'match_option', 'mac_address', 'comment']
+
+networks = [networkheader,
+            ['network', '10.0.0.0', '255.255.255.0', 'first'],
+            ['network', '10.0.1.0', '255.255.255.0', 'second'],
+            ['network', '10.0.0.0', '255.255.255.0', 'duplicate of row 1'],
+            ['network', '10.0.1.128', '255.255.255.128', 'inside row 2'],
+            ['network', '10.0.2.0', 'not a netmask', 'invalid']]
+ranges = [rangeheader,
+          ['dhcprange', '10.0.0.10', '10.0.0.20', 'fits'],
+          ['dhcprange', '10.0.0.200', '10.0.1.10', 'crosses into row 2'],
+          ['dhcprange', '10.0.0.15', '10.0.0.30', 'overlaps range row 1'],
+          ['dhcprange', '192.168.0.1', '192.168.0.10', 'outside'],
+          ['dhcprange', '10.0.0.50', '10.0.0.40', 'backwards']]
+fixed = [fixedheader,
+         ['fixedaddress', '10.0.0.5', 'RESERVED', '', 'fits'],
+         ['fixedaddress', '172.16.0.1', 'RESERVED', '', 'outside'],
+         ['fixedaddress', '10.0.0.5', 'RESERVED', '', 'duplicate of row 1'],
+         ['fixedaddress', '10.0.1.255', 'RESERVED', '', 'broadcast'],
+         ['fixedaddress', '10.0.1.300', 'RESERVED', '', 'invalid']]
+
+def reasons(validator, objtype):
+    return {rownum: reason for rownum, (reason, values) in validator.rejected.get(objtype, {}).items()}
+
+def validate(writecsv):
+    source = csv2b1ddi.CSVFiles({'network': writecsv('networks.csv', networks), 'dhcprange': writecsv('ranges.csv', ranges),
+                                 'fixedaddress': writecsv('fixed.csv', fixed)})
+    validator = csv2b1ddi.Validator(source)
+    validator.run()
+    return validator
+
+def test_networks(writecsv):
+    rejected = reasons(validate(writecsv), 'network')
+    assert sorted(rejected) == [3, 4, 5]
+    assert rejected[3] == 'Duplicate of network row 1'
+    assert rejected[4] == 'Overlaps network row 2'
+    assert rejected[5].startswith('Invalid address or netmask')
+
+def test_ranges(writecsv):
+    rejected = reasons(validate(writecsv), 'dhcprange')
+    assert sorted(rejected) == [2, 3, 4, 5]
+    assert rejected[2] == 'Range is not inside network row 1'
+    assert rejected[3] == 'Overlaps range row 1'
+    assert rejected[4] == 'Range is outside every network'
+    assert rejected[5].startswith('Start address 10.0.0.50 is after')
+
+def test_fixed(writecsv):
+    rejected = reasons(validate(writecsv), 'fixedaddress')
+    assert sorted(rejected) == [2, 3, 4, 5]
+    assert rejected[2] == 'Address is outside every network'
+    assert rejected[3] == 'Duplicate of fixedaddress row 1'
+    assert rejected[4] == 'Address is the network or broadcast address of network row 2'
+    assert rejected[5].startswith('Invalid address')
+
+def test_containers(writecsv):
+    containers = [containerheader,
+                  ['networkcontainer', '10.0.0.0', '255.255.0.0', 'block'],
+                  ['networkcontainer', '10.0.0.0', '255.255.0.0', 'duplicate block'],
+                  ['networkcontainer', '10.0.0.0', '255.255.255.128', 'inside network row 1']]
+    source = csv2b1ddi.CSVFiles({'networkcontainer': writecsv('blocks.csv', containers), 'network': writecsv('networks.csv', networks[:2])})
+    validator = csv2b1ddi.Validator(source)
+    validator.run()
+    assert reasons(validator, 'networkcontainer') == {2: 'Duplicate of networkcontainer row 1', 3: 'Overlaps network row 1'}
+    assert reasons(validator, 'network') == {}
+
+def test_without_networks(writecsv):
+    # Without networks in the run the subnets are expected to exist in B1DDI, only the rows themselves are checked
+    validator = csv2b1ddi.Validator(csv2b1ddi.CSVFiles({'dhcprange': writecsv('ranges.csv', ranges)}))
+    validator.run()
+    assert sorted(reasons(validator, 'dhcprange')) == [5]
+
+def test_export(writecsv):
+    # A combined export is rejected by the same row numbers as the CSV files per object type
+    export = writecsv('grid.csv', fixed + networks + ranges)
+    validator = csv2b1ddi.Validator(csv2b1ddi.Export(export))
+    validator.run()
+    expected = validate(writecsv)
+    for objtype in ('network', 'dhcprange', 'fixedaddress'):
+        assert reasons(validator, objtype) == reasons(expected, objtype)
+
+def test_writerejects(writecsv, tmp_path):
+    validator = validate(writecsv)
+    filename = str(tmp_path / 'rejects.csv')
+    validator.writerejects(filename)
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'object_type,row,reason,values'
+    assert len(lines) == 1 + 3 + 4 + 4
+    assert 'network,3,Duplicate of network row 1,network,10.0.0.0,255.255.255.0,duplicate of row 1' in lines
+
+def test_export_rejected_values(writecsv):
+    # The values of rows rejected by comparing them with other rows are read again from the export
+    validator = csv2b1ddi.Validator(csv2b1ddi.Export(writecsv('grid.csv', fixed + networks + ranges)))
+    validator.run()
+    assert validator.rejected['network'][4] == ('Overlaps network row 2', tuple(networks[4]))
+    assert validator.rejected['dhcprange'][3] == ('Overlaps range row 1', tuple(ranges[3]))
+
+def test_import_rejected(writecsv, mock, tmp_path):
+    # Rejected rows are not sent, they are written with their reason and count as failures of the run
+    server, ini = mock
+    results = str(tmp_path / 'results.jsonl')
+    migrator = csv2b1ddi.Migrator(ini, 'default', fixed=writecsv('fixed.csv', fixed), networks=writecsv('networks.csv', [networkheader + ['dhcp_members']] + [row + ['dhcp1'] for row in networks[1:]]),
+                                  results=results, journal=str(tmp_path / 'journal'), rejects=str(tmp_path / 'rejects.csv'))
+    run = migrator.run(migrator.validate())
+    assert run.counts['network'] == {'created': 2, 'updated': 0, 'failed': 0, 'rejected': 3, 'skipped': 0}
+    assert run.counts['fixedaddress']['rejected'] == 4
+    assert run.failures() == 7
+    with open(results) as f:
+        lines = [json.loads(line) for line in f]
+    assert {'row': 3, 'type': 'network', 'status': None, 'action': 'rejected', 'id': None, 'error': 'Duplicate of network row 1', 'latency_ms': None} in lines
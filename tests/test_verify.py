@@ -0,0 +1,25 @@
+import json
+
+import csv2b1ddi
+
+networkheader = ['header-network', 'address*', 'netmask*', 'comment', 'dhcp_members']
+fixedheader = ['header-fixedaddress', 'ip_address*', 'match_option', 'mac_address', 'comment']
+
+def test_generated_addresses(writecsv, mock, tmp_path):
+    # The addresses B1DDI creates for subnets, fixed addresses and leases are not extra, a reserved address is
+    server, ini = mock
+    settings = {'networks': writecsv('networks.csv', [networkheader, ['network', '10.0.0.0', '24', '', 'dhcp1']]),
+                'fixed': writecsv('fixed.csv', [fixedheader, ['fixedaddress', '10.0.0.5', 'RESERVED', '', ''], ['fixedaddress', '10.0.0.6', 'MAC_ADDRESS', '00:11:22:33:44:55', '']])}
+    migrator = csv2b1ddi.Migrator(ini, 'default', results=str(tmp_path / 'results.jsonl'), journal=str(tmp_path / 'journal'),
+                                  rejects=str(tmp_path / 'rejects.csv'), **settings)
+    assert migrator.run().failures() == 0
+    with server.lock:
+        space = next(iter(server.objects['/ipam/subnet'].values()))['space']
+        for address, usage in (('10.0.0.0', ['IPAM NETWORK']), ('10.0.0.255', []), ('10.0.0.6', ['DHCP FIXED']),
+                               ('10.0.0.50', ['DHCP LEASED']), ('10.0.0.7', ['IPAM RESERVED'])):
+            server.add('/ipam/address', {'space': space, 'address': address, 'comment': '', 'tags': {}, 'usage': usage})
+    verify = str(tmp_path / 'verify.jsonl')
+    migrator = csv2b1ddi.Migrator(ini, 'default', verify=verify, **settings)
+    assert migrator.verify() == 1
+    with open(verify) as f:
+        assert [json.loads(line)['object'] for line in f] == ['10.0.0.7']